@@ -2,9 +2,9 @@ import os
 from celery import Celery
 
 # Set the default Django settings module for the 'celery' program.
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'alx_travel_ap.settings')
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'alx_travel_app.settings')
 
-app = Celery('alx_travel_ap')
+app = Celery('alx_travel_app')
 
 # Using a string here means the worker doesn't have to serialize
 # the configuration object to child processes.
@@ -1,5 +1,97 @@
+from datetime import timedelta
+
 from django.contrib import admin
-from .models import Category, Listing, ListingImage, Review, Booking
+from django.utils import timezone
+from .models import ArchivedBooking, Category, Listing, ListingImage, Review, Booking
+from .paginators import EstimatedCountPaginator
+
+
+class PerformanceAdminMixin:
+    """
+    Changelist settings for tables with millions of rows: estimated counts for
+    the paginator and no second COUNT(*) for the "show all" link.
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+class CheckInWindowFilter(admin.SimpleListFilter):
+    """
+    Fixed check-in date ranges. Replaces date_hierarchy, which runs DISTINCT
+    date scans over the whole table to build its drill-down links.
+    """
+    title = 'check-in date'
+    parameter_name = 'check_in'
+
+    def lookups(self, request, model_admin):
+        return [
+            ('past', 'Past'),
+            ('today', 'Today'),
+            ('next_7_days', 'Next 7 days'),
+            ('next_30_days', 'Next 30 days'),
+            ('later', 'Later'),
+        ]
+
+    def queryset(self, request, queryset):
+        today = timezone.localdate()
+        if self.value() == 'past':
+            return queryset.filter(check_in_date__lt=today)
+        if self.value() == 'today':
+            return queryset.filter(check_in_date=today)
+        if self.value() == 'next_7_days':
+            return queryset.filter(check_in_date__gt=today, check_in_date__lte=today + timedelta(days=7))
+        if self.value() == 'next_30_days':
+            return queryset.filter(check_in_date__gt=today, check_in_date__lte=today + timedelta(days=30))
+        if self.value() == 'later':
+            return queryset.filter(check_in_date__gt=today + timedelta(days=30))
+        return queryset
+
+
+class FixedRangeFilter(admin.SimpleListFilter):
+    """
+    Fixed numeric ranges over one field. A plain field in list_filter runs a
+    DISTINCT scan over the whole table to build its links; these are static.
+    Subclasses set field and ranges as (value, label, min, max), with max None
+    for an open-ended range.
+    """
+    field = None
+    ranges = []
+
+    def lookups(self, request, model_admin):
+        return [(value, label) for value, label, _, _ in self.ranges]
+
+    def queryset(self, request, queryset):
+        for value, _, low, high in self.ranges:
+            if self.value() == value:
+                queryset = queryset.filter(**{f'{self.field}__gte': low})
+                if high is not None:
+                    queryset = queryset.filter(**{f'{self.field}__lte': high})
+        return queryset
+
+
+class MaxGuestsFilter(FixedRangeFilter):
+    title = 'max guests'
+    parameter_name = 'max_guests'
+    field = 'max_guests'
+    ranges = [
+        ('1-2', '1-2', 1, 2),
+        ('3-4', '3-4', 3, 4),
+        ('5-8', '5-8', 5, 8),
+        ('9+', '9+', 9, None),
+    ]
+
+
+class BedroomsFilter(FixedRangeFilter):
+    title = 'bedrooms'
+    parameter_name = 'bedrooms'
+    field = 'bedrooms'
+    ranges = [
+        ('0', 'Studio', 0, 0),
+        ('1', '1', 1, 1),
+        ('2', '2', 2, 2),
+        ('3', '3', 3, 3),
+        ('4+', '4+', 4, None),
+    ]
 
 
 @admin.register(Category)
@@ -18,7 +110,7 @@ class ListingImageInline(admin.TabularInline):
 
 
 @admin.register(Listing)
-class ListingAdmin(admin.ModelAdmin):
+class ListingAdmin(PerformanceAdminMixin, admin.ModelAdmin):
     list_display = [
         'title', 'host', 'category', 'location',
         'price_per_night', 'max_guests', 'is_available',
@@ -26,10 +118,12 @@ class ListingAdmin(admin.ModelAdmin):
     ]
     list_filter = [
         'category', 'is_available', 'is_active',
-        'created_at', 'max_guests', 'bedrooms'
+        'created_at', MaxGuestsFilter, BedroomsFilter
     ]
     search_fields = ['title', 'description', 'location', 'host__username']
     readonly_fields = ['id', 'created_at', 'updated_at']
+    list_select_related = ['host', 'category']
+    autocomplete_fields = ['host', 'category']
     inlines = [ListingImageInline]
     fieldsets = (
         ('Basic Information', {
@@ -61,6 +155,8 @@ class ListingImageAdmin(admin.ModelAdmin):
     list_filter = ['is_primary', 'created_at']
     search_fields = ['listing__title', 'caption']
     readonly_fields = ['id', 'created_at', 'updated_at']
+    list_select_related = ['listing']
+    autocomplete_fields = ['listing']
 
 
 @admin.register(Review)
@@ -71,19 +167,22 @@ class ReviewAdmin(admin.ModelAdmin):
     list_filter = ['rating', 'is_active', 'created_at']
     search_fields = ['listing__title', 'reviewer__username', 'comment']
     readonly_fields = ['id', 'created_at', 'updated_at']
+    list_select_related = ['listing', 'reviewer']
+    autocomplete_fields = ['listing', 'reviewer']
 
 
 @admin.register(Booking)
-class BookingAdmin(admin.ModelAdmin):
+class BookingAdmin(PerformanceAdminMixin, admin.ModelAdmin):
     list_display = [
         'id', 'listing', 'guest', 'check_in_date',
         'check_out_date', 'number_of_guests', 'total_price',
         'status', 'created_at'
     ]
-    list_filter = ['status', 'check_in_date', 'created_at']
+    list_filter = ['status', CheckInWindowFilter, 'created_at']
     search_fields = ['listing__title', 'guest__username']
     readonly_fields = ['id', 'created_at', 'updated_at']
-    date_hierarchy = 'check_in_date'
+    list_select_related = ['listing', 'guest']
+    autocomplete_fields = ['listing', 'guest']
     fieldsets = (
         ('Booking Information', {
             'fields': ('listing', 'guest', 'status')
@@ -104,6 +203,23 @@ class BookingAdmin(admin.ModelAdmin):
         }),
     )
 
+
+@admin.register(ArchivedBooking)
+class ArchivedBookingAdmin(PerformanceAdminMixin, admin.ModelAdmin):
+    list_display = [
+        'id', 'listing', 'guest', 'check_in_date',
+        'check_out_date', 'total_price', 'status', 'archived_at'
+    ]
+    list_filter = ['status', CheckInWindowFilter]
+    search_fields = ['=id', 'listing__title', 'guest__username']
+    list_select_related = ['listing', 'guest']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
 # Customize admin site headers
 admin.site.site_header = "ALX Travel App Administration"
 admin.site.site_title = "ALX Travel Admin"
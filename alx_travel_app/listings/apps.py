@@ -3,4 +3,7 @@ from django.apps import AppConfig
 class ListingsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'listings'
-    verbose_name = 'Travel Listings'
\ No newline at end of file
+    verbose_name = 'Travel Listings'
+
+    def ready(self):
+        from . import signals  # noqa: F401
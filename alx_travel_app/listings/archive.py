@@ -0,0 +1,89 @@
+# Booking archival
+#
+# Completed and cancelled bookings past the cutoff are copied into
+# ArchivedBooking and deleted from Booking in chunks, keeping the live table
+# (and every availability check against it) small. booking_history() is the
+# read path over both tables for users, admins and reporting.
+#
+# Nothing else moves a booking to 'completed', so complete_past_bookings()
+# does that for confirmed stays that have checked out; without it they would
+# never become archivable.
+#
+# Both walk the (status, check_out_date) index with an id cursor so each
+# chunk starts where the previous one stopped.
+from django.db import transaction
+from django.db.models import BooleanField, Value
+from django.utils import timezone
+
+from .models import ArchivedBooking, Booking
+
+ARCHIVABLE_STATUSES = ['completed', 'cancelled']
+HISTORY_FIELDS = [
+    'id', 'listing_id', 'guest_id', 'check_in_date', 'check_out_date',
+    'number_of_guests', 'total_price', 'status', 'created_at',
+]
+COPIED_FIELDS = HISTORY_FIELDS + ['special_requests', 'updated_at']
+
+
+def complete_past_bookings(today, chunk_size=1000):
+    """
+    Mark confirmed bookings that checked out before today as completed.
+    Returns the number of bookings updated.
+    """
+    completed = 0
+    last_id = 0
+    while True:
+        ids = list(
+            Booking.objects.filter(status='confirmed', check_out_date__lt=today, id__gt=last_id)
+            .order_by('id')
+            .values_list('id', flat=True)[:chunk_size]
+        )
+        if not ids:
+            break
+        completed += Booking.objects.filter(id__in=ids, status='confirmed').update(
+            status='completed', updated_at=timezone.now()
+        )
+        last_id = ids[-1]
+    return completed
+
+
+def archive_bookings(cutoff, chunk_size=1000):
+    """
+    Move archivable bookings that checked out before cutoff into the archive.
+    Each chunk is copied and deleted in one transaction; returns the number
+    of bookings archived.
+    """
+    archived = 0
+    last_id = 0
+    while True:
+        with transaction.atomic():
+            rows = list(
+                Booking.objects.select_for_update(skip_locked=True)
+                .filter(status__in=ARCHIVABLE_STATUSES, check_out_date__lt=cutoff, id__gt=last_id)
+                .order_by('id')
+                .values(*COPIED_FIELDS)[:chunk_size]
+            )
+            if not rows:
+                break
+            ArchivedBooking.objects.bulk_create(
+                [ArchivedBooking(**row) for row in rows],
+                ignore_conflicts=True,
+            )
+            Booking.objects.filter(id__in=[row['id'] for row in rows]).delete()
+        archived += len(rows)
+        last_id = rows[-1]['id']
+    return archived
+
+
+def booking_history(**filters):
+    """
+    Live and archived bookings matching filters as one queryset of dicts,
+    with an 'archived' flag. Order and paginate it like any other queryset.
+    """
+    live = Booking.objects.filter(**filters).annotate(
+        archived=Value(False, output_field=BooleanField())
+    ).values(*HISTORY_FIELDS, 'archived')
+    archived = ArchivedBooking.objects.filter(**filters).annotate(
+        archived=Value(True, output_field=BooleanField())
+    ).values(*HISTORY_FIELDS, 'archived')
+    return live.union(archived, all=True)
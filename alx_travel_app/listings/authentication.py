@@ -0,0 +1,157 @@
+# Cached authentication for the request hot path
+#
+# Once warm, authenticating a request costs two small shared-cache reads and
+# no database queries:
+#
+#   auth-token:{key}         user id the token belongs to, or REVOKED
+#   auth-user-gen:{id}       generation of the user, bumped on every change
+#   auth-user:{id}:{gen}     the pickled user as of that generation
+#
+# Each process keeps an LRU of (user, generation) to skip unpickling, but a
+# local entry is only used while its generation matches the shared one, so
+# invalidation in any process is seen by all of them on their next request.
+# Readers write users under the generation they read *before* hitting the
+# database and only add() token entries, so a stale read racing an
+# invalidation never overwrites it.
+#
+# Token deletes and user saves invalidate through signals (signals.py). Bulk
+# User queryset updates bypass signals; callers must pass the affected ids to
+# invalidate_users(), otherwise the change is seen after AUTH_CACHE_SHARED_TTL.
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+TOKEN_CACHE_KEY = 'auth-token:{}'
+USER_GENERATION_KEY = 'auth-user-gen:{}'
+USER_CACHE_KEY = 'auth-user:{}:{}'
+REVOKED = 0
+
+
+class LocalLRUCache:
+    """Thread-safe, size-bounded LRU."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+_local_users = LocalLRUCache(settings.AUTH_CACHE_LOCAL_SIZE)
+
+
+def _normalise_user_id(user_id):
+    # Sessions store the id as a string.
+    return get_user_model()._meta.pk.to_python(user_id)
+
+
+def _user_generation(user_id):
+    key = USER_GENERATION_KEY.format(user_id)
+    generation = cache.get(key)
+    if generation is None:
+        # Start from the clock so an evicted generation never comes back at
+        # a value that older cached users were stored under.
+        cache.add(key, time.time_ns(), None)
+        generation = cache.get(key)
+    return generation
+
+
+def get_cached_user(user_id):
+    """Return the user with this id from the local LRU, shared cache or database."""
+    user_id = _normalise_user_id(user_id)
+    generation = _user_generation(user_id)
+
+    local = _local_users.get(user_id)
+    if local is not None and local[1] == generation:
+        user = local[0]
+    else:
+        key = USER_CACHE_KEY.format(user_id, generation)
+        user = cache.get(key)
+        if user is None:
+            user = get_user_model()._default_manager.filter(pk=user_id).first()
+            if user is None:
+                return None
+            cache.set(key, user, settings.AUTH_CACHE_SHARED_TTL)
+        _local_users.set(user_id, (user, generation))
+    # Hand out a copy so per-request state (permission caches, backend,
+    # last_login on login) does not leak between requests.
+    return copy.copy(user)
+
+
+def invalidate_token(key):
+    """Mark a token revoked; add() in readers cannot overwrite this."""
+    cache.set(TOKEN_CACHE_KEY.format(key), REVOKED, settings.AUTH_CACHE_SHARED_TTL)
+
+
+def invalidate_users(*user_ids):
+    """Bump the users' generations so every process drops its cached copy."""
+    for user_id in user_ids:
+        key = USER_GENERATION_KEY.format(_normalise_user_id(user_id))
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, time.time_ns(), None)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    TokenAuthentication without the per-request token and user queries.
+    Accepts the same "Authorization: Token <key>" header.
+    """
+
+    def authenticate_credentials(self, key):
+        token_key = TOKEN_CACHE_KEY.format(key)
+        user_id = cache.get(token_key)
+        if user_id is None:
+            user_id = Token.objects.filter(key=key).values_list('user_id', flat=True).first()
+            if user_id is None:
+                raise exceptions.AuthenticationFailed(_('Invalid token.'))
+            # add(): a revocation that landed while we read must win.
+            cache.add(token_key, user_id, settings.AUTH_CACHE_SHARED_TTL)
+            user_id = cache.get(token_key, user_id)
+        if user_id == REVOKED:
+            raise exceptions.AuthenticationFailed(_('Invalid token.'))
+
+        user = get_cached_user(user_id)
+        if user is None or not user.is_active:
+            raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+
+        return (user, Token(key=key, user=user))
+
+
+class CachedModelBackend(ModelBackend):
+    """
+    ModelBackend whose get_user() (called by AuthenticationMiddleware for every
+    session-authenticated request) is served from the auth cache.
+    """
+
+    def get_user(self, user_id):
+        user = get_cached_user(user_id)
+        return user if user is not None and self.user_can_authenticate(user) else None
@@ -0,0 +1,81 @@
+# Flexible-date availability search
+#
+# Answers "which N-night stays are free in the next D days" for one or many
+# listings with a single bookings query and a linear sweep per listing,
+# instead of one check_availability query per candidate start date.
+from collections import defaultdict
+from datetime import timedelta
+
+from django.utils import timezone
+
+from .models import Booking
+
+BLOCKING_STATUSES = ['confirmed', 'pending']
+
+
+def free_windows(bookings, start, days, nights):
+    """
+    Return the offsets (days from start) at which an N-night stay fits entirely
+    inside [start, start + days) without overlapping any (check_in, check_out)
+    in bookings.
+    """
+    # Difference array of booked nights, then a prefix sum gives a 0/1 per day.
+    delta = [0] * (days + 1)
+    for check_in, check_out in bookings:
+        first = max((check_in - start).days, 0)
+        last = min((check_out - start).days, days)
+        if first < last:
+            delta[first] += 1
+            delta[last] -= 1
+
+    offsets = []
+    booked = 0
+    blocked_in_window = 0
+    blocked = []
+    for day in range(days):
+        booked += delta[day]
+        blocked.append(1 if booked else 0)
+        blocked_in_window += blocked[day]
+        if day >= nights:
+            blocked_in_window -= blocked[day - nights]
+        if day >= nights - 1 and not blocked_in_window:
+            offsets.append(day - nights + 1)
+    return offsets
+
+
+def find_windows(listings, nights, within_days, limit=10):
+    """
+    Return {listing_id: [window, ...]} with up to limit free windows per
+    listing, cheapest first and then earliest. Each window is a dict with
+    check_in, check_out and total_price.
+    """
+    start = timezone.localdate()
+    end = start + timedelta(days=within_days)
+    listings = [listing for listing in listings if listing.is_available]
+
+    bookings = defaultdict(list)
+    rows = Booking.objects.filter(
+        listing_id__in=[listing.id for listing in listings],
+        status__in=BLOCKING_STATUSES,
+        check_in_date__lt=end,
+        check_out_date__gt=start,
+    ).values_list('listing_id', 'check_in_date', 'check_out_date')
+    for listing_id, check_in, check_out in rows:
+        bookings[listing_id].append((check_in, check_out))
+
+    results = {}
+    for listing in listings:
+        total_price = listing.price_per_night * nights
+        windows = [
+            {
+                'check_in': start + timedelta(days=offset),
+                'check_out': start + timedelta(days=offset + nights),
+                'total_price': total_price,
+            }
+            for offset in free_windows(bookings[listing.id], start, within_days, nights)
+        ]
+        # Nightly price is flat today, so this reduces to earliest-first, but
+        # keeps the contract if per-date pricing is introduced.
+        windows.sort(key=lambda window: (window['total_price'], window['check_in']))
+        results[listing.id] = windows[:limit]
+    return results
@@ -0,0 +1,187 @@
+# iCal availability feeds for channel managers
+#
+# Each listing's busy periods are rendered once and cached until one of its
+# bookings changes (see signals.py), so polling an unchanged feed costs a
+# cache hit and, with a matching ETag / If-Modified-Since, a 304.
+#
+# Cached entries are keyed by a per-listing version that invalidation bumps,
+# so a reader that rendered old rows just before a commit writes its stale
+# entry under a version nobody reads any more.
+#
+# Feeds are not behind API authentication (channel managers only take a
+# URL), so every feed URL carries a secret token derived from SECRET_KEY and
+# the listing's calendar_secret or the host's HostFeedSecret. Rotating either
+# (rotate_feed_secrets) revokes the URLs handed out before. The listing
+# secret is kept in the cached entry, so checking a token costs no query.
+import datetime
+import hashlib
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare, salted_hmac
+
+from .models import Booking, HostFeedSecret, Listing, new_feed_secret
+
+CACHE_KEY = 'listing-calendar:{}:{}'
+VERSION_KEY = 'listing-calendar-version:{}'
+CACHE_TIMEOUT = 60 * 60 * 24
+BLOCKING_STATUSES = ['confirmed', 'pending']
+PRODID = '-//ALX Travel App//Availability//EN'
+
+
+def feed_token(scope, object_id, secret):
+    """Token for a listing ('listing') or host ('host') feed URL, given its current secret."""
+    return salted_hmac(f'listings.calendars.{scope}', f'{object_id}:{secret}').hexdigest()[:32]
+
+
+def check_feed_token(scope, object_id, secret, token):
+    return bool(token and secret) and constant_time_compare(feed_token(scope, object_id, secret), token)
+
+
+def host_feed_secret(host_id):
+    """The host's current feed secret, or None if no host feed URL was ever issued."""
+    return HostFeedSecret.objects.filter(host_id=host_id).values_list('secret', flat=True).first()
+
+
+def rotate_feed_secrets(listing):
+    """Replace the listing's and its host's feed secrets, revoking their old feed URLs."""
+    listing.calendar_secret = new_feed_secret()
+    Listing.objects.filter(pk=listing.pk).update(calendar_secret=listing.calendar_secret)
+    HostFeedSecret.objects.update_or_create(host_id=listing.host_id, defaults={'secret': new_feed_secret()})
+    # Cached entries carry the listing secret.
+    transaction.on_commit(lambda: invalidate_listing_calendar(listing.pk))
+
+
+def _event_uid(booking_id):
+    # Opaque but stable, so the feed does not expose internal booking ids.
+    return salted_hmac('listings.calendars.uid', str(booking_id)).hexdigest()[:24]
+
+
+def _ical_date(value):
+    return value.strftime('%Y%m%d')
+
+
+def _ical_datetime(value):
+    return value.astimezone(datetime.timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+
+def _render_events(listing_id):
+    """Render the VEVENT blocks for a listing's upcoming blocking bookings."""
+    bookings = Booking.objects.filter(
+        listing_id=listing_id,
+        status__in=BLOCKING_STATUSES,
+        check_out_date__gte=timezone.localdate(),
+    ).order_by('check_in_date').values_list(
+        'id', 'check_in_date', 'check_out_date', 'status', 'updated_at'
+    )
+
+    lines = []
+    for booking_id, check_in, check_out, status, updated_at in bookings:
+        lines += [
+            'BEGIN:VEVENT',
+            f'UID:{_event_uid(booking_id)}@alxtravelapp.local',
+            f'DTSTAMP:{_ical_datetime(updated_at)}',
+            f'DTSTART;VALUE=DATE:{_ical_date(check_in)}',
+            f'DTEND;VALUE=DATE:{_ical_date(check_out)}',
+            'SUMMARY:Not available',
+            f"STATUS:{'CONFIRMED' if status == 'confirmed' else 'TENTATIVE'}",
+            f'X-ALX-LISTING-ID:{listing_id}',
+            'END:VEVENT',
+        ]
+    return lines
+
+
+def _wrap(name, events):
+    lines = [
+        'BEGIN:VCALENDAR',
+        'VERSION:2.0',
+        f'PRODID:{PRODID}',
+        'CALSCALE:GREGORIAN',
+        'METHOD:PUBLISH',
+        f'X-WR-CALNAME:{name}',
+    ] + events + ['END:VCALENDAR']
+    return '\r\n'.join(lines) + '\r\n'
+
+
+def _etag(body):
+    return hashlib.sha256(body.encode()).hexdigest()[:32]
+
+
+def _build_entry(listing_id, secret):
+    # Entries are only rebuilt when a booking changes or the cache entry
+    # expires, so the render time is a safe Last-Modified. The latest booking
+    # updated_at is not: deleting a booking would not move it forward.
+    events = _render_events(listing_id)
+    body = _wrap(f'Listing {listing_id}', events)
+    return {
+        'events': events,
+        'body': body,
+        'etag': _etag(body),
+        'last_modified': timezone.now().replace(microsecond=0),
+        'secret': secret,
+    }
+
+
+def _versions(listing_ids):
+    """Current cache version per listing, initialising missing ones."""
+    keys = {VERSION_KEY.format(listing_id): listing_id for listing_id in listing_ids}
+    versions = cache.get_many(list(keys))
+    for key in set(keys) - set(versions):
+        # Start from the clock so a version key that was evicted never comes
+        # back at a value that older cached entries were written under.
+        cache.add(key, time.time_ns(), None)
+        versions[key] = cache.get(key)
+    return {keys[key]: version for key, version in versions.items()}
+
+
+def get_listing_calendar(listing_id, version=None):
+    """
+    Return the cached feed entry for a listing, rendering it on a miss.
+    Returns None if the listing does not exist or is inactive.
+    """
+    if version is None:
+        version = _versions([listing_id])[listing_id]
+    key = CACHE_KEY.format(listing_id, version)
+    entry = cache.get(key)
+    if entry is None:
+        secret = Listing.objects.filter(pk=listing_id, is_active=True) \
+            .values_list('calendar_secret', flat=True).first()
+        if secret is None:
+            return None
+        entry = _build_entry(listing_id, secret)
+        cache.set(key, entry, CACHE_TIMEOUT)
+    return entry
+
+
+def get_bulk_calendar(listing_ids, name='Listings'):
+    """Combine several listings' cached events into one feed."""
+    versions = _versions(listing_ids)
+    keys = {CACHE_KEY.format(listing_id, versions[listing_id]): listing_id for listing_id in listing_ids}
+    cached = cache.get_many(list(keys))
+    entries = []
+    for key, listing_id in keys.items():
+        entry = cached.get(key) or get_listing_calendar(listing_id, versions[listing_id])
+        if entry is not None:
+            entries.append(entry)
+    if not entries:
+        return None
+
+    events = [line for entry in entries for line in entry['events']]
+    body = _wrap(name, events)
+    return {
+        'body': body,
+        'etag': _etag(body),
+        'last_modified': max(entry['last_modified'] for entry in entries),
+    }
+
+
+def invalidate_listing_calendar(*listing_ids):
+    """Bump the listings' versions so the next poll regenerates their feeds."""
+    for listing_id in listing_ids:
+        key = VERSION_KEY.format(listing_id)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, time.time_ns(), None)
@@ -0,0 +1,8 @@
+# Custom signals for the listings app. Kept apart from signals.py (which holds
+# the receivers and imports tasks) so tasks can send them without a cycle.
+from django.dispatch import Signal
+
+# Sent after bookings are changed with a bulk UPDATE/DELETE, which bypasses
+# the per-instance post_save/post_delete handlers in signals.py.
+# Provides: listing_ids (a set of affected listing ids).
+bookings_bulk_changed = Signal()
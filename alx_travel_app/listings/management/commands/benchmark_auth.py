@@ -0,0 +1,73 @@
+import time
+from importlib import import_module
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.request import Request
+
+from listings.authentication import (
+    CachedModelBackend, CachedTokenAuthentication, invalidate_token, invalidate_users
+)
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Compare per-request DB queries and latency of cached vs. stock authentication'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        # Everything the benchmark creates is rolled back, so it is safe to
+        # run against any database.
+        with transaction.atomic():
+            try:
+                self.run(options['requests'])
+            finally:
+                transaction.set_rollback(True)
+
+    def run(self, n):
+        user = User.objects.create_user(username='auth-benchmark', email='auth-benchmark@example.com')
+        token = Token.objects.create(user=user)
+        db_sessions = import_module('django.contrib.sessions.backends.db').SessionStore
+        cached_sessions = import_module('django.contrib.sessions.backends.cached_db').SessionStore
+        session = cached_sessions()
+        session['_auth_user_id'] = str(user.pk)
+        session.create()
+        factory = RequestFactory()
+
+        def token_request(authenticator):
+            request = Request(factory.get('/', HTTP_AUTHORIZATION=f'Token {token.key}'))
+            return lambda: authenticator.authenticate(request)
+
+        try:
+            self.stdout.write(f'{n} authenticated requests per row\n')
+            self.report('Token (DRF)', token_request(TokenAuthentication()), n)
+            self.report('Token (cached)', token_request(CachedTokenAuthentication()), n)
+            self.report('Session store (db)', lambda: db_sessions(session.session_key).load(), n)
+            self.report('Session store (cached_db)', lambda: cached_sessions(session.session_key).load(), n)
+            self.report('Session user (ModelBackend)', lambda: ModelBackend().get_user(user.pk), n)
+            self.report('Session user (cached)', lambda: CachedModelBackend().get_user(user.pk), n)
+        finally:
+            # The rows are rolled back; drop what went into the shared cache too.
+            session.delete()
+            invalidate_token(token.key)
+            invalidate_users(user.pk)
+
+    def report(self, label, authenticate, n):
+        with CaptureQueriesContext(connection) as context:
+            start = time.perf_counter()
+            for _ in range(n):
+                authenticate()
+            elapsed = time.perf_counter() - start
+        self.stdout.write(
+            f'{label:<30} {len(context.captured_queries) / n:6.3f} queries/request '
+            f'{elapsed / n * 1e6:9.1f} us/request'
+        )
@@ -1,6 +1,6 @@
 from django.core.management.base import BaseCommand
 from django.contrib.auth import get_user_model
-from listings.models import Listing, Booking, Review
+from listings.models import Category, Listing, Booking, Review
 import random
 from datetime import datetime, timedelta
 
@@ -13,6 +13,7 @@ class Command(BaseCommand):
     def handle(self, *args, **options):
         self.stdout.write('Seeding data...')
         self.create_users()
+        self.create_categories()
         self.create_listings()
         self.create_bookings()
         self.create_reviews()
@@ -33,13 +34,19 @@ class Command(BaseCommand):
                 password='testpass123'
             )
 
+    def create_categories(self):
+        for name, slug in [('Apartments', 'apartments'), ('Villas', 'villas'), ('Cabins', 'cabins')]:
+            Category.objects.get_or_create(slug=slug, defaults={'name': name})
+
     def create_listings(self):
-        owner = User.objects.get(email='owner@example.com')
+        host = User.objects.get(email='owner@example.com')
+        categories = {category.slug: category for category in Category.objects.all()}
         listings_data = [
             {
                 'title': 'Beautiful Apartment in Downtown',
                 'description': 'A cozy apartment with great views',
-                'address': '123 Main St, Cityville',
+                'category': categories['apartments'],
+                'location': '123 Main St, Cityville',
                 'property_type': 'APARTMENT',
                 'price_per_night': 120.00,
                 'bedrooms': 2,
@@ -50,7 +57,8 @@ class Command(BaseCommand):
             {
                 'title': 'Luxury Villa with Pool',
                 'description': 'Spacious villa perfect for families',
-                'address': '456 Beach Rd, Seaview',
+                'category': categories['villas'],
+                'location': '456 Beach Rd, Seaview',
                 'property_type': 'VILLA',
                 'price_per_night': 350.00,
                 'bedrooms': 4,
@@ -61,7 +69,8 @@ class Command(BaseCommand):
             {
                 'title': 'Cozy Cabin in the Woods',
                 'description': 'Perfect getaway in nature',
-                'address': '789 Forest Ln, Mountainview',
+                'category': categories['cabins'],
+                'location': '789 Forest Ln, Mountainview',
                 'property_type': 'CABIN',
                 'price_per_night': 95.00,
                 'bedrooms': 1,
@@ -72,23 +81,25 @@ class Command(BaseCommand):
         ]
 
         for listing_data in listings_data:
-            Listing.objects.get_or_create(owner=owner, **listing_data)
+            Listing.objects.get_or_create(host=host, **listing_data)
 
     def create_bookings(self):
         guest = User.objects.get(email='guest@example.com')
         listings = Listing.objects.all()
 
         for listing in listings:
-            start_date = datetime.now() + timedelta(days=random.randint(1, 30))
-            end_date = start_date + timedelta(days=random.randint(1, 14))
-            total_price = (end_date - start_date).days * listing.price_per_night
+            check_in_date = datetime.now().date() + timedelta(days=random.randint(1, 30))
+            check_out_date = check_in_date + timedelta(days=random.randint(1, 14))
+            total_price = (check_out_date - check_in_date).days * listing.price_per_night
 
             Booking.objects.get_or_create(
                 listing=listing,
-                user=guest,
-                start_date=start_date,
-                end_date=end_date,
-                total_price=total_price
+                guest=guest,
+                check_in_date=check_in_date,
+                check_out_date=check_out_date,
+                number_of_guests=1,
+                total_price=total_price,
+                status='confirmed'
             )
 
     def create_reviews(self):
@@ -98,7 +109,7 @@ class Command(BaseCommand):
         for booking in bookings:
             Review.objects.get_or_create(
                 listing=booking.listing,
-                user=guest,
+                reviewer=guest,
                 rating=random.randint(3, 5),
                 comment=f"Great stay at {booking.listing.title}! Would recommend."
             )
\ No newline at end of file
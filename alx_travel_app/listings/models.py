@@ -1,8 +1,29 @@
+import secrets
+
 from django.db import models
 from django.contrib.auth import get_user_model
 
 User = get_user_model()
 
+def new_feed_secret():
+    """Random value mixed into calendar feed tokens; replacing it revokes old feed URLs."""
+    return secrets.token_hex(16)
+
+class Category(models.Model):
+    name = models.CharField(max_length=100, unique=True)
+    slug = models.SlugField(max_length=100, unique=True)
+    description = models.TextField(blank=True)
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['name']
+        verbose_name_plural = 'categories'
+
+    def __str__(self):
+        return self.name
+
 class Listing(models.Model):
     PROPERTY_TYPES = [
         ('APARTMENT', 'Apartment'),
@@ -14,31 +35,81 @@ class Listing(models.Model):
 
     title = models.CharField(max_length=255)
     description = models.TextField()
-    address = models.TextField()
-    property_type = models.CharField(max_length=20, choices=PROPERTY_TYPES)
+    category = models.ForeignKey(Category, on_delete=models.PROTECT, related_name='listings')
+    host = models.ForeignKey(User, on_delete=models.CASCADE, related_name='listings')
+    location = models.CharField(max_length=255)
+    latitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
+    longitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
+    property_type = models.CharField(max_length=20, choices=PROPERTY_TYPES, default='APARTMENT')
     price_per_night = models.DecimalField(max_digits=10, decimal_places=2)
     bedrooms = models.PositiveIntegerField()
     bathrooms = models.PositiveIntegerField()
     max_guests = models.PositiveIntegerField()
     amenities = models.TextField(blank=True)
-    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='listings')
+    house_rules = models.TextField(blank=True)
+    check_in_time = models.TimeField(null=True, blank=True)
+    check_out_time = models.TimeField(null=True, blank=True)
+    is_available = models.BooleanField(default=True)
+    is_active = models.BooleanField(default=True)
+    calendar_secret = models.CharField(max_length=32, default=new_feed_secret, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.title
 
+class HostFeedSecret(models.Model):
+    """Per-host secret for the combined calendar feed of all of a host's listings."""
+    host = models.OneToOneField(User, on_delete=models.CASCADE, related_name='feed_secret')
+    secret = models.CharField(max_length=32, default=new_feed_secret)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Feed secret for {self.host_id}"
+
+class ListingImage(models.Model):
+    listing = models.ForeignKey(Listing, on_delete=models.CASCADE, related_name='images')
+    image = models.ImageField(upload_to='listing_images/')
+    caption = models.CharField(max_length=255, blank=True)
+    is_primary = models.BooleanField(default=False)
+    order = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['order', 'id']
+
+    def __str__(self):
+        return f"Image {self.order} of {self.listing.title}"
+
 class Booking(models.Model):
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('confirmed', 'Confirmed'),
+        ('cancelled', 'Cancelled'),
+        ('completed', 'Completed'),
+    ]
+
     listing = models.ForeignKey(Listing, on_delete=models.CASCADE, related_name='bookings')
-    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='bookings')
-    start_date = models.DateField()
-    end_date = models.DateField()
-    total_price = models.DecimalField(max_digits=10, decimal_places=2)
+    guest = models.ForeignKey(User, on_delete=models.CASCADE, related_name='bookings')
+    check_in_date = models.DateField()
+    check_out_date = models.DateField()
+    number_of_guests = models.PositiveIntegerField(default=1)
+    # Filled in from the listing's nightly price when left blank (signals.py).
+    total_price = models.DecimalField(max_digits=10, decimal_places=2, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    special_requests = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # Serves complete_past_bookings and archive_bookings.
+            models.Index(fields=['status', 'check_out_date']),
+        ]
+
     def __str__(self):
-        return f"{self.user.email} booked {self.listing.title}"
+        return f"{self.guest.email} booked {self.listing.title}"
 
 class Review(models.Model):
     RATING_CHOICES = [
@@ -50,11 +121,40 @@ class Review(models.Model):
     ]
 
     listing = models.ForeignKey(Listing, on_delete=models.CASCADE, related_name='reviews')
-    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='reviews')
+    reviewer = models.ForeignKey(User, on_delete=models.CASCADE, related_name='reviews')
     rating = models.PositiveIntegerField(choices=RATING_CHOICES)
     comment = models.TextField()
+    is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
-        return f"{self.user.email} rated {self.listing.title} {self.rating} stars"
\ No newline at end of file
+        return f"{self.reviewer.email} rated {self.listing.title} {self.rating} stars"
+
+class ArchivedBooking(models.Model):
+    """
+    Completed and cancelled bookings moved out of Booking by
+    listings.archive.archive_bookings. Keeps the original booking id so
+    references in emails, payments, etc. still resolve.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    listing = models.ForeignKey(Listing, on_delete=models.CASCADE, related_name='archived_bookings')
+    guest = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_bookings')
+    check_in_date = models.DateField()
+    check_out_date = models.DateField()
+    number_of_guests = models.PositiveIntegerField()
+    total_price = models.DecimalField(max_digits=10, decimal_places=2)
+    status = models.CharField(max_length=20, choices=Booking.STATUS_CHOICES)
+    special_requests = models.TextField(blank=True)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['guest', '-check_in_date']),
+            models.Index(fields=['listing', '-check_in_date']),
+        ]
+
+    def __str__(self):
+        return f"Archived booking {self.id} for {self.listing_id}"
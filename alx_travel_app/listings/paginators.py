@@ -0,0 +1,51 @@
+from django.core.paginator import Paginator
+from django.db import connections, router
+from django.utils.functional import cached_property
+
+
+def estimated_row_count(model):
+    """
+    Return the database's own row estimate for a model's table, or None when
+    the backend has no cheap way to provide one.
+    """
+    connection = connections[router.db_for_read(model)]
+    table = model._meta.db_table
+
+    if connection.vendor == 'mysql':
+        sql = (
+            'SELECT TABLE_ROWS FROM information_schema.TABLES '
+            'WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s'
+        )
+    elif connection.vendor == 'postgresql':
+        # regclass resolves the name through search_path, so a same-named
+        # table in another schema cannot match.
+        sql = 'SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass'
+    else:
+        return None
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [table])
+        row = cursor.fetchone()
+    if row is None or row[0] is None or row[0] < 0:
+        return None
+    return int(row[0])
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator that uses the table's estimated row count for unfiltered
+    querysets instead of a COUNT(*) over the whole table.
+
+    Filtered querysets, and tables small enough that an exact count is cheap,
+    still get an exact count.
+    """
+    exact_count_threshold = 10000
+
+    @cached_property
+    def count(self):
+        query = getattr(self.object_list, 'query', None)
+        if query is not None and not query.where:
+            estimate = estimated_row_count(self.object_list.model)
+            if estimate is not None and estimate > self.exact_count_threshold:
+                return estimate
+        return super().count
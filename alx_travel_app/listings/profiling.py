@@ -0,0 +1,149 @@
+# On-demand sampling profiler for individual API requests
+#
+# A background thread snapshots the request thread's stack every few
+# milliseconds via sys._current_frames(), so the request itself runs at full
+# speed apart from the GIL handoffs. Samples are written as collapsed stacks
+# ("frame;frame;frame count" per line), the input format of flamegraph.pl and
+# speedscope.
+#
+# A request is profiled when either:
+#   - a staff user sends the X-Profile: 1 header or ?_profile=1, or
+#   - REQUEST_PROFILER_SAMPLE_RATE is N > 0 and it is the Nth request on its route.
+# Staff status is checked before the sampler starts, running the configured
+# DRF authenticators for token users; anyone else's flag is ignored. Only the
+# newest REQUEST_PROFILER_MAX_FILES profiles are kept.
+import itertools
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from rest_framework.exceptions import APIException
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+PROFILE_HEADER = 'HTTP_X_PROFILE'
+PROFILE_PARAM = '_profile'
+
+
+class StackSampler:
+    """Sample one thread's Python stack at a fixed interval."""
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        return self.samples
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.samples[self._collapse(frame)] += 1
+
+    @staticmethod
+    def _collapse(frame):
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            filename = code.co_filename.split('site-packages' + os.sep)[-1]
+            stack.append(f'{code.co_name} ({filename}:{code.co_firstlineno})'.replace(';', ':'))
+            frame = frame.f_back
+        return ';'.join(reversed(stack))
+
+
+class RequestProfilerMiddleware:
+    """
+    Profile flagged or sampled requests and write their collapsed stacks to
+    REQUEST_PROFILER_DIR. Staff get the file name in the X-Profile-Id header.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, 'REQUEST_PROFILER_SAMPLE_RATE', 0)
+        self.interval = getattr(settings, 'REQUEST_PROFILER_INTERVAL', 0.005)
+        self.output_dir = settings.REQUEST_PROFILER_DIR
+        self.max_files = getattr(settings, 'REQUEST_PROFILER_MAX_FILES', 500)
+        self._route_counters = defaultdict(lambda: itertools.count(1))
+
+    def __call__(self, request):
+        request._profiler = None
+        response = self.get_response(request)
+        sampler = request._profiler
+        if sampler is None:
+            return response
+
+        samples = sampler.stop()
+        if samples:
+            name = self._write(request, samples)
+            if request._profile_staff:
+                response['X-Profile-Id'] = name
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        route = request.resolver_match.route if request.resolver_match else request.path
+        requested = request.META.get(PROFILE_HEADER) == '1' or request.GET.get(PROFILE_PARAM) == '1'
+        is_staff = requested and self._is_staff(request)
+        sampled = bool(self.sample_rate) and next(self._route_counters[route]) % self.sample_rate == 0
+
+        if is_staff or sampled:
+            request._profile_route = route
+            request._profile_staff = is_staff
+            request._profiler = StackSampler(threading.get_ident(), self.interval)
+            request._profiler.start()
+        return None
+
+    @staticmethod
+    def _is_staff(request):
+        """Resolve the caller before profiling: session user first, then DRF authenticators."""
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated:
+            return user.is_staff
+        drf_request = Request(request)
+        for authentication_class in api_settings.DEFAULT_AUTHENTICATION_CLASSES:
+            try:
+                result = authentication_class().authenticate(drf_request)
+            except APIException:
+                return False
+            if result is not None:
+                return result[0].is_staff
+        return False
+
+    def _prune(self):
+        """Delete the oldest profiles beyond REQUEST_PROFILER_MAX_FILES."""
+        entries = []
+        for entry in os.scandir(self.output_dir):
+            if entry.name.endswith('.folded'):
+                try:
+                    entries.append((entry.stat().st_mtime, entry.path))
+                except FileNotFoundError:
+                    # Pruned by another worker meanwhile.
+                    continue
+        entries.sort()
+        for _, path in entries[:max(len(entries) - self.max_files, 0)]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def _write(self, request, samples):
+        route = re.sub(r'[^A-Za-z0-9]+', '-', request._profile_route).strip('-') or 'root'
+        name = f'{time.strftime("%Y%m%d-%H%M%S")}-{request.method.lower()}-{route}-{os.getpid()}-{threading.get_ident()}.folded'
+        os.makedirs(self.output_dir, exist_ok=True)
+        with open(os.path.join(self.output_dir, name), 'w') as fh:
+            for stack, count in samples.most_common():
+                fh.write(f'{stack} {count}\n')
+        self._prune()
+        return name
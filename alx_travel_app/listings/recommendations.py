@@ -0,0 +1,371 @@
+# Similar listings recommendation index
+#
+# The index is a set of NumPy arrays written to SIMILAR_LISTINGS_INDEX_DIR and
+# opened with mmap_mode so every worker process shares the same pages:
+#
+#   ids.npy         sorted listing ids, one per row
+#   features.npy    L2-normalised feature vectors (float32)
+#   neighbours.npy  precomputed nearest neighbour ids per row (-1 = empty slot)
+#   scores.npy      cosine similarity for each neighbour
+#   meta.json       scaling and vocabulary needed to vectorise a single listing
+#
+# Each rebuild writes a new version directory and atomically repoints CURRENT,
+# so readers never observe a half-built index. Incremental refreshes rewrite
+# single rows of the current version in place, so a reader racing one may see
+# a row mixing old and new neighbours; every id in it is still a real listing
+# and similar_listing_ids() drops duplicates.
+#
+# Refreshes and the final swap of a rebuild are serialised with an flock on
+# LOCK. Every refresh is also appended to the REFRESHED journal; a rebuild
+# replays the ids journaled while it was running onto the new version before
+# making it current, so those updates are not lost at the swap. Only one
+# rebuild runs at a time (a non-blocking flock on BUILD_LOCK); an overlapping
+# one is skipped rather than queued behind it.
+import fcntl
+import json
+import math
+import os
+from contextlib import contextmanager
+import shutil
+import threading
+import time
+from collections import Counter
+
+import numpy as np
+from django.conf import settings
+
+from .models import Listing
+
+NUMERIC_FIELDS = ['price_per_night', 'bedrooms', 'bathrooms', 'max_guests']
+MAX_AMENITIES = 64
+AMENITY_WEIGHT = 0.5
+LOCATION_WEIGHT = 2.0
+# Upper bound on scratch memory for one block of similarity rows: each cell
+# costs a float32 similarity plus an int64 argpartition index.
+BUILD_MEMORY_BUDGET = 256 * 1024 * 1024
+
+_lock = threading.Lock()
+_loaded = {'version': None, 'index': None}
+
+
+def _index_dir():
+    return settings.SIMILAR_LISTINGS_INDEX_DIR
+
+
+def _chunk_size(n):
+    """Rows per similarity block so a block x n stays within BUILD_MEMORY_BUDGET."""
+    return max(1, BUILD_MEMORY_BUDGET // (max(n, 1) * 12))
+
+
+@contextmanager
+def _index_lock():
+    os.makedirs(_index_dir(), exist_ok=True)
+    with open(os.path.join(_index_dir(), 'LOCK'), 'a') as fh:
+        fcntl.flock(fh, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(fh, fcntl.LOCK_UN)
+
+
+@contextmanager
+def _build_lock():
+    """Yield True if this process may build, False if another build holds the lock."""
+    os.makedirs(_index_dir(), exist_ok=True)
+    with open(os.path.join(_index_dir(), 'BUILD_LOCK'), 'a') as fh:
+        try:
+            fcntl.flock(fh, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(fh, fcntl.LOCK_UN)
+
+
+def _journal_path():
+    return os.path.join(_index_dir(), 'REFRESHED')
+
+
+def _neighbour_count():
+    return getattr(settings, 'SIMILAR_LISTINGS_NEIGHBOURS', 20)
+
+
+def _parse_amenities(value):
+    return {a.strip().lower() for a in (value or '').split(',') if a.strip()}
+
+
+def _raw_numeric(listing):
+    price = float(listing['price_per_night'] or 0)
+    return [
+        math.log1p(max(price, 0.0)),
+        float(listing['bedrooms'] or 0),
+        float(listing['bathrooms'] or 0),
+        float(listing['max_guests'] or 0),
+    ]
+
+
+def _location(listing):
+    """Project latitude/longitude onto the unit sphere so distance is meaningful."""
+    lat, lon = listing.get('latitude'), listing.get('longitude')
+    if lat is None or lon is None:
+        return [0.0, 0.0, 0.0]
+    lat, lon = math.radians(float(lat)), math.radians(float(lon))
+    return [
+        math.cos(lat) * math.cos(lon),
+        math.cos(lat) * math.sin(lon),
+        math.sin(lat),
+    ]
+
+
+def _vectorise(listing, meta):
+    """Turn one listing (as a dict of field values) into a normalised feature vector."""
+    numeric = (np.array(_raw_numeric(listing)) - meta['mean']) / meta['std']
+
+    types = meta['property_types']
+    property_type = np.zeros(len(types))
+    if listing['property_type'] in types:
+        property_type[types.index(listing['property_type'])] = 1.0
+
+    vocabulary = meta['amenities']
+    amenities = np.zeros(len(vocabulary))
+    for amenity in _parse_amenities(listing['amenities']):
+        if amenity in vocabulary:
+            amenities[vocabulary.index(amenity)] = AMENITY_WEIGHT
+
+    location = np.array(_location(listing)) * LOCATION_WEIGHT
+
+    vector = np.concatenate([numeric, property_type, amenities, location]).astype(np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def _listing_values(queryset):
+    fields = ['id', 'property_type', 'amenities', 'latitude', 'longitude'] + NUMERIC_FIELDS
+    return queryset.filter(is_active=True).order_by('id').values(*fields)
+
+
+def _top_k(rows, features, ids, row_positions, k):
+    """
+    Return the k most similar ids/scores for each row, excluding the row
+    itself, as (len(rows), k) arrays padded with -1 / 0 when there are fewer
+    than k other listings.
+    """
+    # Negate in place so argpartition's "smallest" are the most similar,
+    # without a second block-sized copy.
+    similarities = rows @ features.T
+    np.negative(similarities, out=similarities)
+    similarities[np.arange(len(row_positions)), row_positions] = np.inf
+
+    neighbours = np.full((len(row_positions), k), -1, dtype=np.int64)
+    scores = np.zeros((len(row_positions), k), dtype=np.float32)
+    k = min(k, features.shape[0] - 1)
+    if k <= 0:
+        return neighbours, scores
+
+    candidates = np.argpartition(similarities, k - 1, axis=1)[:, :k]
+    candidate_scores = -np.take_along_axis(similarities, candidates, axis=1)
+    del similarities
+    order = np.argsort(-candidate_scores, axis=1)
+    neighbours[:, :k] = ids[np.take_along_axis(candidates, order, axis=1)]
+    scores[:, :k] = np.take_along_axis(candidate_scores, order, axis=1)
+    return neighbours, scores
+
+
+def _current_version():
+    try:
+        with open(os.path.join(_index_dir(), 'CURRENT')) as fh:
+            return fh.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def _open_index(version, mode='r'):
+    path = os.path.join(_index_dir(), version)
+    return _open_path(path, mode)
+
+
+def _open_path(path, mode='r'):
+    with open(os.path.join(path, 'meta.json')) as fh:
+        meta = json.load(fh)
+    meta['mean'] = np.array(meta['mean'])
+    meta['std'] = np.array(meta['std'])
+    return {
+        'meta': meta,
+        'ids': np.load(os.path.join(path, 'ids.npy'), mmap_mode='r'),
+        'features': np.load(os.path.join(path, 'features.npy'), mmap_mode=mode),
+        'neighbours': np.load(os.path.join(path, 'neighbours.npy'), mmap_mode=mode),
+        'scores': np.load(os.path.join(path, 'scores.npy'), mmap_mode=mode),
+    }
+
+
+def get_index():
+    """Return the memory-mapped index for the current version, or None if not built."""
+    version = _current_version()
+    if version is None:
+        return None
+    if _loaded['version'] != version:
+        with _lock:
+            if _loaded['version'] != version:
+                _loaded['index'] = _open_index(version)
+                _loaded['version'] = version
+    return _loaded['index']
+
+
+def build_index():
+    """
+    Build a fresh index from all active listings and make it current.
+    Returns the number of listings indexed, or None if another build is
+    already running.
+    """
+    with _build_lock() as acquired:
+        if not acquired:
+            return None
+        return _build_index()
+
+
+def _build_index():
+    # Refreshes journaled from here on may not be in the snapshot read below.
+    with _index_lock():
+        try:
+            journal_start = os.path.getsize(_journal_path())
+        except FileNotFoundError:
+            journal_start = 0
+
+    listings = list(_listing_values(Listing.objects.all()))
+    if not listings:
+        return 0
+
+    raw = np.array([_raw_numeric(listing) for listing in listings])
+    amenity_counts = Counter(a for listing in listings for a in _parse_amenities(listing['amenities']))
+    std = raw.std(axis=0)
+    meta = {
+        'mean': raw.mean(axis=0),
+        'std': np.where(std > 0, std, 1.0),
+        'property_types': [choice for choice, _ in Listing.PROPERTY_TYPES],
+        'amenities': [a for a, _ in amenity_counts.most_common(MAX_AMENITIES)],
+    }
+
+    ids = np.array([listing['id'] for listing in listings], dtype=np.int64)
+    features = np.vstack([_vectorise(listing, meta) for listing in listings])
+
+    k = _neighbour_count()
+    neighbours = np.empty((len(ids), k), dtype=np.int64)
+    scores = np.empty((len(ids), k), dtype=np.float32)
+    chunk_size = _chunk_size(len(ids))
+    for start in range(0, len(ids), chunk_size):
+        positions = np.arange(start, min(start + chunk_size, len(ids)))
+        neighbours[positions], scores[positions] = _top_k(features[positions], features, ids, positions, k)
+
+    version = f'v{time.time_ns()}'
+    path = os.path.join(_index_dir(), version)
+    os.makedirs(path)
+    np.save(os.path.join(path, 'ids.npy'), ids)
+    np.save(os.path.join(path, 'features.npy'), features)
+    np.save(os.path.join(path, 'neighbours.npy'), neighbours)
+    np.save(os.path.join(path, 'scores.npy'), scores)
+    with open(os.path.join(path, 'meta.json'), 'w') as fh:
+        json.dump({
+            'mean': meta['mean'].tolist(),
+            'std': meta['std'].tolist(),
+            'property_types': meta['property_types'],
+            'amenities': meta['amenities'],
+        }, fh)
+
+    with _index_lock():
+        # Replay refreshes that ran during the build onto the new version
+        # while nobody reads it yet, then swap and start a fresh journal.
+        try:
+            with open(_journal_path()) as fh:
+                fh.seek(journal_start)
+                refreshed = {int(line) for line in fh.read().split()}
+        except FileNotFoundError:
+            refreshed = set()
+        if refreshed:
+            new_index = _open_path(path, mode='r+')
+            for listing_id in sorted(refreshed):
+                _apply_refresh(new_index, listing_id)
+
+        previous = _current_version()
+        pointer = os.path.join(_index_dir(), 'CURRENT.tmp')
+        with open(pointer, 'w') as fh:
+            fh.write(version)
+        os.replace(pointer, os.path.join(_index_dir(), 'CURRENT'))
+        open(_journal_path(), 'w').close()
+
+        # Workers that still have the previous version mapped keep their
+        # pages until they notice the new CURRENT; anything older can go.
+        keep = {_current_version(), previous}
+        for name in os.listdir(_index_dir()):
+            if name.startswith('v') and name not in keep:
+                shutil.rmtree(os.path.join(_index_dir(), name), ignore_errors=True)
+    return len(ids)
+
+
+def refresh_listing(listing_id):
+    """
+    Update a single listing's vector and neighbour lists in the current index.
+    New listings are not in the index yet and are picked up by the next rebuild.
+    """
+    with _index_lock():
+        with open(_journal_path(), 'a') as fh:
+            fh.write(f'{listing_id}\n')
+        version = _current_version()
+        if version is None:
+            return False
+        return _apply_refresh(_open_index(version, mode='r+'), listing_id)
+
+
+def _apply_refresh(index, listing_id):
+    """Rewrite listing_id's row and every neighbour list it affects. Caller holds the lock."""
+    ids = index['ids']
+    position = int(np.searchsorted(ids, listing_id))
+    if position >= len(ids) or ids[position] != listing_id:
+        return False
+
+    listing = _listing_values(Listing.objects.filter(pk=listing_id)).first()
+    features, neighbours, scores = index['features'], index['neighbours'], index['scores']
+    if listing is None:
+        # Deactivated: make the row orthogonal to everything so it drops out.
+        features[position] = 0
+    else:
+        features[position] = _vectorise(listing, index['meta'])
+
+    similarities = features @ features[position]
+    similarities[position] = -np.inf
+    affected = np.flatnonzero(
+        (neighbours == listing_id).any(axis=1) | (similarities > scores[:, -1])
+    )
+    affected = np.union1d(affected, [position])
+    chunk_size = _chunk_size(len(ids))
+    for start in range(0, len(affected), chunk_size):
+        positions = affected[start:start + chunk_size]
+        rows_neighbours, rows_scores = _top_k(
+            np.array(features[positions]), features, ids, positions, neighbours.shape[1]
+        )
+        neighbours[positions] = rows_neighbours
+        scores[positions] = rows_scores
+
+    for array in (features, neighbours, scores):
+        array.flush()
+    return True
+
+
+def similar_listing_ids(listing_id, k=10):
+    """Return up to k ids of listings most similar to listing_id, best first."""
+    index = get_index()
+    if index is None:
+        return []
+    ids = index['ids']
+    position = int(np.searchsorted(ids, listing_id))
+    if position >= len(ids) or ids[position] != listing_id:
+        return []
+    row = np.array(index['neighbours'][position])
+    scores = np.array(index['scores'][position])
+    # A row being rewritten by refresh_listing can briefly hold an id twice.
+    result = []
+    for i, score in zip(row, scores):
+        if i >= 0 and score > 0 and i != listing_id and int(i) not in result:
+            result.append(int(i))
+    return result[:k]
@@ -0,0 +1,59 @@
+# Cached review summary (average, count, rating distribution) per listing.
+# Rebuilt from one GROUP BY query on a miss and invalidated by the review
+# save/delete signals.
+#
+# Entries are keyed by a per-listing version that invalidation bumps (the
+# same scheme as calendars.py), so a reader that aggregated old rows just
+# before a commit writes its stale summary under a version nobody reads.
+import time
+
+from django.core.cache import cache
+from django.db.models import Count
+
+from .models import Review
+
+CACHE_KEY = 'listing-review-summary:{}:{}'
+VERSION_KEY = 'listing-review-summary-version:{}'
+CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def _version(listing_id):
+    key = VERSION_KEY.format(listing_id)
+    version = cache.get(key)
+    if version is None:
+        # Start from the clock so an evicted version never comes back at a
+        # value that older summaries were written under.
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key)
+    return version
+
+
+def get_review_summary(listing_id):
+    """Return {'average', 'count', 'distribution'} for a listing's active reviews."""
+    # Read the version before the reviews, never after.
+    key = CACHE_KEY.format(listing_id, _version(listing_id))
+    summary = cache.get(key)
+    if summary is None:
+        rows = Review.objects.filter(listing_id=listing_id, is_active=True) \
+            .values('rating').annotate(count=Count('id')).order_by()
+        distribution = {str(rating): 0 for rating, _ in Review.RATING_CHOICES}
+        for row in rows:
+            distribution[str(row['rating'])] = row['count']
+        count = sum(distribution.values())
+        total = sum(int(rating) * n for rating, n in distribution.items())
+        summary = {
+            'average': round(total / count, 2) if count else None,
+            'count': count,
+            'distribution': distribution,
+        }
+        cache.set(key, summary, CACHE_TIMEOUT)
+    return summary
+
+
+def invalidate_review_summary(listing_id):
+    """Bump the listing's version so the next read rebuilds its summary."""
+    key = VERSION_KEY.format(listing_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), None)
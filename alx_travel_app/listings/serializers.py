@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from .models import Listing, Booking, Review
+from .models import Category, Listing, ListingImage, Booking, Review
 from django.contrib.auth import get_user_model
 
 User = get_user_model()
@@ -11,17 +11,40 @@ class UserSerializer(serializers.ModelSerializer):
         fields = ['id', 'username', 'email']
 
 
+class CategorySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Category
+        fields = '__all__'
+
+
+class ListingImageSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ListingImage
+        fields = '__all__'
+
+
 class ListingSerializer(serializers.ModelSerializer):
-    owner = UserSerializer(read_only=True)
+    host = UserSerializer(read_only=True)
+    images = ListingImageSerializer(many=True, read_only=True)
 
     class Meta:
         model = Listing
-        fields = '__all__'
+        exclude = ['calendar_secret']
+
+
+class ListingListSerializer(serializers.ModelSerializer):
+    """Listing as shown in lists and search results: no nested objects."""
+    class Meta:
+        model = Listing
+        fields = [
+            'id', 'title', 'category', 'host', 'location', 'property_type',
+            'price_per_night', 'max_guests', 'bedrooms', 'bathrooms', 'is_available',
+        ]
 
 
 class BookingSerializer(serializers.ModelSerializer):
     listing = ListingSerializer(read_only=True)
-    user = UserSerializer(read_only=True)
+    guest = UserSerializer(read_only=True)
 
     class Meta:
         model = Booking
@@ -30,8 +53,37 @@ class BookingSerializer(serializers.ModelSerializer):
 
 class ReviewSerializer(serializers.ModelSerializer):
     listing = ListingSerializer(read_only=True)
-    user = UserSerializer(read_only=True)
+    reviewer = UserSerializer(read_only=True)
+
+    class Meta:
+        model = Review
+        fields = '__all__'
+
+
+class BookingHistorySerializer(serializers.Serializer):
+    """A live or archived booking row from listings.archive.booking_history."""
+    id = serializers.IntegerField()
+    listing = serializers.IntegerField(source='listing_id')
+    check_in_date = serializers.DateField()
+    check_out_date = serializers.DateField()
+    number_of_guests = serializers.IntegerField()
+    total_price = serializers.DecimalField(max_digits=10, decimal_places=2)
+    status = serializers.CharField()
+    created_at = serializers.DateTimeField()
+    archived = serializers.BooleanField()
+
+
+class ReviewerSerializer(serializers.ModelSerializer):
+    """Public view of a reviewer: no email or other contact details."""
+    class Meta:
+        model = User
+        fields = ['id', 'username']
+
+
+class ListingReviewSerializer(serializers.ModelSerializer):
+    """Review as listed under its listing: no nested listing, minimal reviewer."""
+    reviewer = ReviewerSerializer(read_only=True)
 
     class Meta:
         model = Review
-        fields = '__all__'
\ No newline at end of file
+        fields = ['id', 'reviewer', 'rating', 'comment', 'created_at']
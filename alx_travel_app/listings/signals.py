@@ -1,8 +1,15 @@
 # Django signals for the listings app
-from django.db.models.signals import post_save, pre_save
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
 from django.contrib.auth.models import User
+from rest_framework.authtoken.models import Token
 from .models import Listing, Review, Booking
+from .authentication import invalidate_token, invalidate_users
+from .calendars import invalidate_listing_calendar
+from .events import bookings_bulk_changed
+from .reviews import invalidate_review_summary
+from .tasks import refresh_similar_listing
 
 
 @receiver(post_save, sender=Listing)
@@ -15,6 +22,11 @@ def listing_post_save(sender, instance, created, **kwargs):
         # Add any logic for newly created listings
         pass
 
+    # Keep the similar listings index in step with edits; new listings are
+    # picked up by the periodic rebuild.
+    transaction.on_commit(lambda: refresh_similar_listing.delay(instance.pk))
+    transaction.on_commit(lambda: invalidate_listing_calendar(instance.pk))
+
 
 @receiver(post_save, sender=Review)
 def review_post_save(sender, instance, created, **kwargs):
@@ -26,6 +38,17 @@ def review_post_save(sender, instance, created, **kwargs):
         # Add any logic for new reviews
         pass
 
+    transaction.on_commit(lambda: invalidate_review_summary(instance.listing_id))
+
+
+@receiver(post_delete, sender=Review)
+def review_post_delete(sender, instance, **kwargs):
+    """
+    Signal handler for when a review is deleted.
+    Drops the listing's cached review summary.
+    """
+    transaction.on_commit(lambda: invalidate_review_summary(instance.listing_id))
+
 
 @receiver(post_save, sender=Booking)
 def booking_post_save(sender, instance, created, **kwargs):
@@ -37,6 +60,49 @@ def booking_post_save(sender, instance, created, **kwargs):
         # Add any logic for new bookings
         pass
 
+    transaction.on_commit(lambda: invalidate_listing_calendar(instance.listing_id))
+
+
+@receiver(post_delete, sender=Booking)
+def booking_post_delete(sender, instance, **kwargs):
+    """
+    Signal handler for when a booking is deleted.
+    Drops the listing's cached calendar feed.
+    """
+    # Only blocking bookings appear in the feed; this also keeps archival,
+    # which deletes completed/cancelled bookings in bulk, from touching the cache.
+    if instance.status not in ('confirmed', 'pending'):
+        return
+    transaction.on_commit(lambda: invalidate_listing_calendar(instance.listing_id))
+
+
+@receiver(bookings_bulk_changed)
+def bookings_bulk_changed_handler(sender, listing_ids, **kwargs):
+    """
+    Signal handler for bulk booking changes.
+    Drops the cached calendar feeds of every affected listing.
+    """
+    if listing_ids:
+        invalidate_listing_calendar(*listing_ids)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_changed(sender, instance, **kwargs):
+    """
+    Signal handler for when a user is saved or deleted.
+    Drops the cached user so deactivation takes effect on the next request.
+    """
+    transaction.on_commit(lambda: invalidate_users(instance.pk))
+
+
+@receiver(post_delete, sender=Token)
+def token_post_delete(sender, instance, **kwargs):
+    """
+    Signal handler for when an auth token is revoked.
+    """
+    transaction.on_commit(lambda: invalidate_token(instance.key))
+
 
 @receiver(pre_save, sender=Booking)
 def booking_pre_save(sender, instance, **kwargs):
@@ -0,0 +1,74 @@
+from datetime import timedelta
+
+from celery import shared_task
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from . import recommendations
+from .archive import archive_bookings, complete_past_bookings
+from .events import bookings_bulk_changed
+from .models import Booking
+
+
+@shared_task
+def rebuild_similar_listings_index():
+    """Rebuild the similar listings index from scratch."""
+    return recommendations.build_index()
+
+
+@shared_task
+def refresh_similar_listing(listing_id):
+    """Refresh one listing's entry in the similar listings index."""
+    return recommendations.refresh_listing(listing_id)
+
+
+@shared_task
+def expire_pending_bookings(ttl_minutes=None, chunk_size=None):
+    """
+    Cancel pending bookings older than the TTL so abandoned checkouts stop
+    blocking availability. Works in chunks of bulk UPDATEs, each in its own
+    transaction, and returns the number of bookings expired.
+    """
+    if ttl_minutes is None:
+        ttl_minutes = settings.PENDING_BOOKING_TTL_MINUTES
+    if chunk_size is None:
+        chunk_size = settings.PENDING_BOOKING_EXPIRY_CHUNK_SIZE
+    cutoff = timezone.now() - timedelta(minutes=ttl_minutes)
+
+    expired = 0
+    while True:
+        with transaction.atomic():
+            rows = list(
+                Booking.objects.select_for_update(skip_locked=True)
+                .filter(status='pending', created_at__lt=cutoff)
+                .order_by('id')
+                .values_list('id', 'listing_id')[:chunk_size]
+            )
+            if not rows:
+                break
+            updated = Booking.objects.filter(
+                id__in=[booking_id for booking_id, _ in rows],
+                status='pending',
+            ).update(status='cancelled', updated_at=timezone.now())
+
+            listing_ids = {listing_id for _, listing_id in rows}
+            transaction.on_commit(
+                lambda listing_ids=listing_ids: bookings_bulk_changed.send(
+                    sender=Booking, listing_ids=listing_ids
+                )
+            )
+        expired += updated
+    return expired
+
+
+@shared_task
+def archive_old_bookings():
+    """
+    Mark checked-out confirmed bookings completed, then archive completed and
+    cancelled bookings past BOOKING_ARCHIVE_AFTER_DAYS.
+    """
+    today = timezone.localdate()
+    complete_past_bookings(today, chunk_size=settings.BOOKING_ARCHIVE_CHUNK_SIZE)
+    cutoff = today - timedelta(days=settings.BOOKING_ARCHIVE_AFTER_DAYS)
+    return archive_bookings(cutoff, chunk_size=settings.BOOKING_ARCHIVE_CHUNK_SIZE)
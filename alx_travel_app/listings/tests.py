@@ -0,0 +1,724 @@
+import os
+import shutil
+import tempfile
+import time
+from collections import Counter
+from datetime import date, timedelta
+from unittest import mock
+
+from django.contrib import admin
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.authtoken.models import Token
+from rest_framework.request import Request
+
+from . import recommendations, reviews
+from .admin import BedroomsFilter, CheckInWindowFilter, MaxGuestsFilter
+from .authentication import (
+    CachedModelBackend, CachedTokenAuthentication, _local_users, invalidate_users
+)
+from .archive import archive_bookings, complete_past_bookings
+from .events import bookings_bulk_changed
+from .models import ArchivedBooking, Category, Listing, Booking, Review
+from .paginators import EstimatedCountPaginator
+from .tasks import expire_pending_bookings
+from .views import ListingViewSet
+
+User = get_user_model()
+
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+def make_category(name='Cabins', slug='cabins'):
+    return Category.objects.get_or_create(slug=slug, defaults={'name': name})[0]
+
+
+def make_listing(host, **overrides):
+    """Create an active listing; any field can be overridden."""
+    fields = {
+        'title': 'Listing',
+        'description': 'A place to stay',
+        'location': 'Mountainview',
+        'price_per_night': 100,
+        'max_guests': 2,
+        'bedrooms': 1,
+        'bathrooms': 1,
+        **overrides,
+    }
+    if 'category' not in fields:
+        fields['category'] = make_category()
+    return Listing.objects.create(host=host, **fields)
+
+
+def make_booking(listing, guest, check_in_date, nights=2, **overrides):
+    """Create a confirmed booking; any field can be overridden."""
+    fields = {
+        'check_out_date': check_in_date + timedelta(days=nights),
+        'number_of_guests': 1,
+        'total_price': 200,
+        'status': 'confirmed',
+        **overrides,
+    }
+    return Booking.objects.create(listing=listing, guest=guest, check_in_date=check_in_date, **fields)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class AdminChangelistQueryCountTests(TestCase):
+    """The Listing and Booking changelists must not issue a query per row."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin_user = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='testpass123'
+        )
+
+    def setUp(self):
+        # The session user is served by CachedModelBackend.
+        cache.clear()
+        self.client.force_login(self.admin_user)
+
+    def create_rows(self, count):
+        start = Listing.objects.count()
+        for i in range(start, start + count):
+            host = User.objects.create_user(username=f'host{i}', password='testpass123')
+            guest = User.objects.create_user(username=f'guest{i}', password='testpass123')
+            listing = make_listing(host, title=f'Listing {i}')
+            make_booking(listing, guest, date.today() + timedelta(days=i + 1))
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries)
+
+    def assertConstantQueries(self, url):
+        self.create_rows(1)
+        # Warm the session user and content type caches first, so the
+        # baseline only counts per-page queries.
+        self.count_queries(url)
+        baseline = self.count_queries(url)
+        self.create_rows(10)
+        self.assertEqual(self.count_queries(url), baseline)
+
+    def test_listing_changelist_query_count_is_constant(self):
+        self.assertConstantQueries(reverse('admin:listings_listing_changelist'))
+
+    def test_booking_changelist_query_count_is_constant(self):
+        self.assertConstantQueries(reverse('admin:listings_booking_changelist'))
+
+    def test_booking_change_form_does_not_load_fk_choices(self):
+        self.create_rows(1)
+        booking = Booking.objects.get()
+        url = reverse('admin:listings_booking_change', args=[booking.pk])
+        self.count_queries(url)
+        baseline = self.count_queries(url)
+        self.create_rows(10)
+        self.assertEqual(self.count_queries(url), baseline)
+
+    def test_listing_changelist_filters_do_not_scan_distinct_values(self):
+        self.create_rows(3)
+        with CaptureQueriesContext(connection) as context:
+            self.client.get(reverse('admin:listings_listing_changelist'))
+        self.assertFalse([q['sql'] for q in context.captured_queries if 'DISTINCT' in q['sql']])
+
+
+class EstimatedCountPaginatorTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        host = User.objects.create_user(username='host', password='testpass123')
+        for i in range(3):
+            make_listing(host, title=f'Listing {i}', is_available=bool(i))
+
+    @mock.patch('listings.paginators.estimated_row_count', return_value=5000000)
+    def test_unfiltered_queryset_uses_estimate(self, estimate):
+        paginator = EstimatedCountPaginator(Listing.objects.order_by('id'), 20)
+        with self.assertNumQueries(0):
+            self.assertEqual(paginator.count, 5000000)
+        estimate.assert_called_once_with(Listing)
+
+    @mock.patch('listings.paginators.estimated_row_count', return_value=5000000)
+    def test_filtered_queryset_counts_exactly(self, estimate):
+        paginator = EstimatedCountPaginator(Listing.objects.filter(is_available=True).order_by('id'), 20)
+        self.assertEqual(paginator.count, 2)
+        estimate.assert_not_called()
+
+    @mock.patch('listings.paginators.estimated_row_count', return_value=50)
+    def test_small_table_counts_exactly(self, estimate):
+        paginator = EstimatedCountPaginator(Listing.objects.order_by('id'), 20)
+        self.assertEqual(paginator.count, 3)
+
+    @mock.patch('listings.paginators.estimated_row_count', return_value=None)
+    def test_backend_without_estimate_counts_exactly(self, estimate):
+        paginator = EstimatedCountPaginator(Listing.objects.order_by('id'), 20)
+        self.assertEqual(paginator.count, 3)
+
+
+class CheckInWindowFilterTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        host = User.objects.create_user(username='host', password='testpass123')
+        cls.guest = User.objects.create_user(username='guest', password='testpass123')
+        cls.listing = make_listing(host)
+        today = timezone.localdate()
+        cls.bookings = {
+            name: make_booking(cls.listing, cls.guest, today + timedelta(days=offset))
+            for name, offset in [('past', -3), ('today', 0), ('next_7_days', 5),
+                                 ('next_30_days', 20), ('later', 60)]
+        }
+
+    def filtered(self, value):
+        request = RequestFactory().get('/')
+        params = {'check_in': value} if value else {}
+        list_filter = CheckInWindowFilter(request, params, Booking, admin.site._registry[Booking])
+        return set(list_filter.queryset(request, Booking.objects.all()))
+
+    def test_each_window_selects_its_bookings(self):
+        # "Next 30 days" includes the next 7.
+        expected = {name: {booking} for name, booking in self.bookings.items()}
+        expected['next_30_days'].add(self.bookings['next_7_days'])
+        for name, bookings in expected.items():
+            with self.subTest(window=name):
+                self.assertEqual(self.filtered(name), bookings)
+
+    def test_no_selection_returns_everything(self):
+        self.assertEqual(self.filtered(None), set(self.bookings.values()))
+
+
+class FixedRangeFilterTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        host = User.objects.create_user(username='host', password='testpass123')
+        cls.listings = {
+            (guests, bedrooms): make_listing(host, max_guests=guests, bedrooms=bedrooms)
+            for guests, bedrooms in [(2, 0), (4, 1), (6, 3), (12, 5)]
+        }
+
+    def filtered(self, filter_class, value):
+        request = RequestFactory().get('/')
+        list_filter = filter_class(request, {filter_class.parameter_name: value}, Listing,
+                                   admin.site._registry[Listing])
+        return {(listing.max_guests, listing.bedrooms)
+                for listing in list_filter.queryset(request, Listing.objects.all())}
+
+    def test_max_guests_ranges(self):
+        self.assertEqual(self.filtered(MaxGuestsFilter, '3-4'), {(4, 1)})
+        self.assertEqual(self.filtered(MaxGuestsFilter, '9+'), {(12, 5)})
+
+    def test_bedrooms_ranges(self):
+        self.assertEqual(self.filtered(BedroomsFilter, '0'), {(2, 0)})
+        self.assertEqual(self.filtered(BedroomsFilter, '4+'), {(12, 5)})
+
+
+class SimilarListingsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        host = User.objects.create_user(username='host', password='testpass123')
+        cls.cabins = [
+            make_listing(host, title=f'Cabin {i}', property_type='CABIN',
+                         amenities='Fireplace, Kitchen', price_per_night=100 + i)
+            for i in range(3)
+        ]
+        cls.villa = make_listing(host, title='Villa', location='Seaview', property_type='VILLA',
+                                 amenities='Pool', price_per_night=900, max_guests=10,
+                                 bedrooms=5, bathrooms=4)
+
+    def setUp(self):
+        index_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, index_dir)
+        index_settings = override_settings(SIMILAR_LISTINGS_INDEX_DIR=index_dir)
+        index_settings.enable()
+        self.addCleanup(index_settings.disable)
+
+    def similar(self, listing, **params):
+        return self.client.get(reverse('listings:listing-similar', args=[listing.id]), params)
+
+    def test_returns_nearest_listings_first(self):
+        self.assertEqual(recommendations.build_index(), 4)
+        response = self.similar(self.cabins[0], k=2)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row['id'] for row in response.data], [self.cabins[1].id, self.cabins[2].id])
+
+    def test_k_must_be_a_positive_integer(self):
+        for k in ['0', '-1', 'many']:
+            with self.subTest(k=k):
+                self.assertEqual(self.similar(self.cabins[0], k=k).status_code, 400)
+
+    def test_k_is_capped_at_the_stored_neighbours(self):
+        recommendations.build_index()
+        with override_settings(SIMILAR_LISTINGS_NEIGHBOURS=1):
+            response = self.similar(self.cabins[0], k=3)
+        self.assertEqual(len(response.data), 1)
+
+    def test_overlapping_build_is_skipped(self):
+        with recommendations._build_lock() as acquired:
+            self.assertTrue(acquired)
+            self.assertIsNone(recommendations.build_index())
+        self.assertEqual(recommendations.build_index(), 4)
+
+
+class FlexibleSearchTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        host = User.objects.create_user(username='host', password='testpass123')
+        guest = User.objects.create_user(username='guest', password='testpass123')
+        # Prices are a permutation of 10..230, so creation order (the
+        # default list ordering) differs from price order.
+        for i in range(23):
+            make_listing(host, title=f'Listing {i}', price_per_night=((i * 7) % 23 + 1) * 10)
+        cls.booked = make_listing(host, title='Booked out', price_per_night=5)
+        today = timezone.localdate()
+        make_booking(cls.booked, guest, today - timedelta(days=1), nights=60)
+
+    def search(self, **params):
+        response = self.client.get(reverse('listings:listing-flexible-search'),
+                                   {'nights': 2, 'within_days': 10, **params})
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def prices(self, page):
+        return [int(float(row['listing']['price_per_night'])) for row in page['results']]
+
+    def test_pages_are_ordered_and_skip_listings_without_a_window(self):
+        first, second = self.search(), self.search(page=2)
+        self.assertEqual(first['count'], 23)
+        self.assertEqual(self.prices(first) + self.prices(second), list(range(10, 240, 10)))
+
+    def test_candidates_are_the_cheapest_listings(self):
+        with mock.patch.object(ListingViewSet, 'MAX_FLEXIBLE_CANDIDATES', 3):
+            page = self.search()
+        # The booked-out listing takes a candidate slot but has no window.
+        self.assertEqual(self.prices(page), [10, 20])
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ExpirePendingBookingsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        host = User.objects.create_user(username='host', password='testpass123')
+        cls.guest = User.objects.create_user(username='guest', password='testpass123')
+        cls.listings = [make_listing(host, title=f'Listing {i}') for i in range(2)]
+
+    def create_booking(self, listing, status, age_minutes):
+        booking = make_booking(listing, self.guest, date.today() + timedelta(days=10), status=status)
+        Booking.objects.filter(pk=booking.pk).update(
+            created_at=timezone.now() - timedelta(minutes=age_minutes)
+        )
+        return booking
+
+    def test_expires_stale_pending_bookings_in_chunks(self):
+        stale = [self.create_booking(self.listings[i % 2], 'pending', 120) for i in range(5)]
+        with self.captureOnCommitCallbacks(execute=True):
+            expired = expire_pending_bookings(ttl_minutes=30, chunk_size=2)
+        self.assertEqual(expired, 5)
+        self.assertEqual(
+            set(Booking.objects.filter(pk__in=[b.pk for b in stale]).values_list('status', flat=True)),
+            {'cancelled'}
+        )
+
+    def test_leaves_fresh_and_non_pending_bookings_alone(self):
+        fresh = self.create_booking(self.listings[0], 'pending', 5)
+        confirmed = self.create_booking(self.listings[0], 'confirmed', 120)
+        completed = self.create_booking(self.listings[0], 'completed', 120)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(expire_pending_bookings(ttl_minutes=30, chunk_size=2), 0)
+        for booking, status in [(fresh, 'pending'), (confirmed, 'confirmed'), (completed, 'completed')]:
+            booking.refresh_from_db()
+            self.assertEqual(booking.status, status)
+
+    def test_zero_ttl_expires_immediately(self):
+        booking = self.create_booking(self.listings[0], 'pending', 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(expire_pending_bookings(ttl_minutes=0), 1)
+        booking.refresh_from_db()
+        self.assertEqual(booking.status, 'cancelled')
+
+    def test_sends_bulk_changed_event_after_commit(self):
+        self.create_booking(self.listings[0], 'pending', 120)
+        self.create_booking(self.listings[1], 'pending', 120)
+        received = []
+
+        def receiver(sender, listing_ids, **kwargs):
+            received.append(set(listing_ids))
+
+        bookings_bulk_changed.connect(receiver)
+        self.addCleanup(bookings_bulk_changed.disconnect, receiver)
+        with self.captureOnCommitCallbacks() as callbacks:
+            expire_pending_bookings(ttl_minutes=30, chunk_size=10)
+        self.assertEqual(received, [])
+        for callback in callbacks:
+            callback()
+        self.assertEqual(received, [{listing.id for listing in self.listings}])
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class BookingArchiveTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        host = User.objects.create_user(username='host', password='testpass123')
+        cls.guest = User.objects.create_user(username='guest', password='testpass123')
+        cls.listing = make_listing(host)
+        cls.today = timezone.localdate()
+        cls.cutoff = cls.today - timedelta(days=180)
+
+    def booking(self, days_ago, status, guest=None):
+        return make_booking(self.listing, guest or self.guest, self.today - timedelta(days=days_ago),
+                            status=status)
+
+    def test_complete_past_bookings_in_chunks(self):
+        checked_out = [self.booking(10 + i, 'confirmed') for i in range(5)]
+        staying = self.booking(1, 'confirmed')
+        pending = self.booking(10, 'pending')
+        self.assertEqual(complete_past_bookings(self.today, chunk_size=2), 5)
+        self.assertEqual(
+            set(Booking.objects.filter(status='completed').values_list('id', flat=True)),
+            {booking.id for booking in checked_out}
+        )
+        for booking, status in [(staying, 'confirmed'), (pending, 'pending')]:
+            booking.refresh_from_db()
+            self.assertEqual(booking.status, status)
+
+    def test_archive_moves_rows_in_chunks_and_keeps_ids(self):
+        old = [self.booking(400 + i, 'completed' if i % 2 else 'cancelled') for i in range(5)]
+        self.assertEqual(archive_bookings(self.cutoff, chunk_size=2), 5)
+        self.assertFalse(Booking.objects.filter(id__in=[booking.id for booking in old]).exists())
+        archived = ArchivedBooking.objects.in_bulk()
+        self.assertEqual(set(archived), {booking.id for booking in old})
+        for booking in old:
+            self.assertEqual(
+                (archived[booking.id].status, archived[booking.id].check_in_date, archived[booking.id].guest_id),
+                (booking.status, booking.check_in_date, booking.guest_id)
+            )
+
+    def test_archive_leaves_blocking_and_recent_bookings_alone(self):
+        kept = [
+            self.booking(400, 'confirmed'),
+            self.booking(400, 'pending'),
+            self.booking(10, 'completed'),
+            self.booking(10, 'cancelled'),
+        ]
+        self.assertEqual(archive_bookings(self.cutoff, chunk_size=2), 0)
+        self.assertEqual(Booking.objects.count(), len(kept))
+        self.assertFalse(ArchivedBooking.objects.exists())
+
+    def test_history_pages_through_live_and_archived_bookings(self):
+        # Alternate live and archived rows so the two tables interleave.
+        for i in range(25):
+            self.booking(400 + i // 2, 'completed' if i % 2 else 'confirmed')
+        other_guest = User.objects.create_user(username='other-guest', password='testpass123')
+        self.booking(400, 'confirmed', guest=other_guest)
+        self.booking(401, 'completed', guest=other_guest)
+        archive_bookings(self.cutoff)
+        expected = [
+            (booking_id, True) for booking_id in
+            ArchivedBooking.objects.filter(guest=self.guest).values_list('id', flat=True)
+        ] + [
+            (booking_id, False) for booking_id in
+            Booking.objects.filter(guest=self.guest).values_list('id', flat=True)
+        ]
+        check_in = dict(
+            list(Booking.objects.values_list('id', 'check_in_date'))
+            + list(ArchivedBooking.objects.values_list('id', 'check_in_date'))
+        )
+        expected.sort(key=lambda row: (check_in[row[0]], row[0]), reverse=True)
+
+        self.client.force_login(self.guest)
+        url = reverse('listings:booking-history')
+        first, second = self.client.get(url).data, self.client.get(url, {'page': 2}).data
+        self.assertEqual(first['count'], 25)
+        self.assertEqual((len(first['results']), len(second['results'])), (20, 5))
+        self.assertEqual(
+            [(row['id'], row['archived']) for row in first['results'] + second['results']],
+            expected
+        )
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class CalendarFeedTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.host = User.objects.create_user(username='host', password='testpass123')
+        cls.other_host = User.objects.create_user(username='other-host', password='testpass123')
+        guest = User.objects.create_user(username='guest', password='testpass123')
+        cls.listing = make_listing(cls.host)
+        cls.other_listing = make_listing(cls.other_host, title='Other listing')
+        check_in = timezone.localdate() + timedelta(days=5)
+        cls.booking = make_booking(cls.listing, guest, check_in)
+        make_booking(cls.other_listing, guest, check_in)
+
+    def setUp(self):
+        # Ids are reused between tests; drop feeds cached by earlier ones.
+        cache.clear()
+        self.client.force_login(self.host)
+        self.feeds = self.client.get(self.feed_urls_url()).data
+
+    def feed_urls_url(self):
+        return reverse('listings:listing-calendar-feed', args=[self.listing.id])
+
+    def test_wrong_or_missing_token_is_not_found(self):
+        listing_url = reverse('listings:listing-calendar', args=[self.listing.id])
+        bulk_url = reverse('listings:bulk-calendar')
+        self.assertEqual(self.client.get(self.feeds['listing_feed']).status_code, 200)
+        self.assertEqual(self.client.get(listing_url).status_code, 404)
+        self.assertEqual(self.client.get(listing_url, {'token': 'x' * 32}).status_code, 404)
+        self.assertEqual(self.client.get(bulk_url, {'host': self.host.id}).status_code, 404)
+        self.assertEqual(self.client.get(bulk_url, {'host': self.host.id, 'token': 'x' * 32}).status_code, 404)
+
+    def test_only_the_host_sees_feed_urls(self):
+        self.client.force_login(self.other_host)
+        self.assertEqual(self.client.get(self.feed_urls_url()).status_code, 403)
+
+    def test_matching_validators_return_not_modified(self):
+        for url in self.feeds.values():
+            response = self.client.get(url)
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+                self.assertEqual(
+                    self.client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code, 304
+                )
+
+    def test_booking_save_changes_etag(self):
+        before = self.client.get(self.feeds['listing_feed'])['ETag']
+        self.booking.check_out_date += timedelta(days=1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.booking.save()
+        self.assertNotEqual(self.client.get(self.feeds['listing_feed'])['ETag'], before)
+
+    def test_bulk_changed_event_changes_etag(self):
+        before = {name: self.client.get(url)['ETag'] for name, url in self.feeds.items()}
+        Booking.objects.filter(pk=self.booking.pk).update(status='cancelled')
+        bookings_bulk_changed.send(sender=Booking, listing_ids={self.listing.id})
+        for name, url in self.feeds.items():
+            with self.subTest(feed=name):
+                self.assertNotEqual(self.client.get(url)['ETag'], before[name])
+
+    def test_listings_param_cannot_reach_other_hosts(self):
+        host_feed = self.feeds['host_feed']
+        self.assertEqual(self.client.get(f'{host_feed}&listings={self.other_listing.id}').status_code, 404)
+        response = self.client.get(f'{host_feed}&listings={self.listing.id},{self.other_listing.id}')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(f'X-ALX-LISTING-ID:{self.listing.id}', response.content.decode())
+        self.assertNotIn(f'X-ALX-LISTING-ID:{self.other_listing.id}', response.content.decode())
+
+    def test_regenerating_revokes_old_urls(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            new_feeds = self.client.post(self.feed_urls_url()).data
+        for name in ['listing_feed', 'host_feed']:
+            with self.subTest(feed=name):
+                self.assertNotEqual(new_feeds[name], self.feeds[name])
+                self.assertEqual(self.client.get(self.feeds[name]).status_code, 404)
+                self.assertEqual(self.client.get(new_feeds[name]).status_code, 200)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ListingReviewsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        host = User.objects.create_user(username='host', password='testpass123')
+        cls.listing = make_listing(host)
+        cls.reviews = [
+            Review.objects.create(
+                listing=cls.listing,
+                reviewer=User.objects.create_user(
+                    username=f'reviewer{i}', email=f'reviewer{i}@example.com', password='testpass123'
+                ),
+                rating=rating,
+                comment='Lovely',
+                is_active=is_active,
+            )
+            for i, (rating, is_active) in enumerate([(5, True), (4, True), (4, True), (1, False)])
+        ]
+
+    def setUp(self):
+        # Ids are reused between tests; drop summaries cached by earlier ones.
+        cache.clear()
+
+    def get(self, **params):
+        return self.client.get(reverse('listings:listing-reviews', args=[self.listing.id]), params)
+
+    def test_summary_counts_active_reviews(self):
+        self.assertEqual(reviews.get_review_summary(self.listing.id), {
+            'average': 4.33,
+            'count': 3,
+            'distribution': {'1': 0, '2': 0, '3': 0, '4': 2, '5': 1},
+        })
+
+    def test_summary_is_cached_until_a_review_changes(self):
+        reviews.get_review_summary(self.listing.id)
+        with self.assertNumQueries(0):
+            reviews.get_review_summary(self.listing.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.reviews[0].delete()
+        self.assertEqual(reviews.get_review_summary(self.listing.id)['count'], 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.reviews[3].is_active = True
+            self.reviews[3].save()
+        self.assertEqual(reviews.get_review_summary(self.listing.id)['distribution']['1'], 1)
+
+    def test_stale_write_after_invalidation_is_not_read(self):
+        # A reader that read the version before an invalidation writes its
+        # summary under the old version.
+        version = reviews._version(self.listing.id)
+        reviews.invalidate_review_summary(self.listing.id)
+        cache.set(reviews.CACHE_KEY.format(self.listing.id, version), {'count': 99})
+        self.assertEqual(reviews.get_review_summary(self.listing.id)['count'], 3)
+
+    def test_page_shape(self):
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.data), ['summary', 'count', 'next', 'previous', 'results'])
+        self.assertEqual(response.data['count'], 3)
+        row = response.data['results'][0]
+        self.assertEqual(set(row), {'id', 'reviewer', 'rating', 'comment', 'created_at'})
+        self.assertEqual(set(row['reviewer']), {'id', 'username'})
+
+    def test_sort(self):
+        expected = {
+            'recent': [self.reviews[2].id, self.reviews[1].id, self.reviews[0].id],
+            'oldest': [self.reviews[0].id, self.reviews[1].id, self.reviews[2].id],
+            'highest': [self.reviews[0].id, self.reviews[2].id, self.reviews[1].id],
+            'lowest': [self.reviews[2].id, self.reviews[1].id, self.reviews[0].id],
+        }
+        for sort, ids in expected.items():
+            with self.subTest(sort=sort):
+                self.assertEqual([row['id'] for row in self.get(sort=sort).data['results']], ids)
+        self.assertEqual(self.get(sort='bogus').status_code, 400)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class RequestProfilerMiddlewareTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user(username='staff', password='testpass123', is_staff=True)
+        cls.user = User.objects.create_user(username='guest', password='testpass123')
+
+    def setUp(self):
+        cache.clear()
+        self.output_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.output_dir)
+        profiler_settings = override_settings(REQUEST_PROFILER_DIR=self.output_dir)
+        profiler_settings.enable()
+        self.addCleanup(profiler_settings.disable)
+        # Stand-in sampler, so the test does not depend on catching a sample.
+        patcher = mock.patch('listings.profiling.StackSampler')
+        self.sampler_class = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.sampler_class.return_value.stop.return_value = Counter({'view (views.py:1)': 3})
+
+    def get(self, **extra):
+        return self.client.get(reverse('listings:listing-list'), **extra)
+
+    def folded_files(self):
+        return sorted(name for name in os.listdir(self.output_dir) if name.endswith('.folded'))
+
+    def test_flag_is_ignored_for_anonymous_and_non_staff_users(self):
+        response = self.get(HTTP_X_PROFILE='1')
+        self.client.force_login(self.user)
+        response_as_user = self.get(HTTP_X_PROFILE='1')
+        self.sampler_class.assert_not_called()
+        self.assertNotIn('X-Profile-Id', response)
+        self.assertNotIn('X-Profile-Id', response_as_user)
+        self.assertEqual(self.folded_files(), [])
+
+    def test_staff_request_gets_profile_id_of_written_file(self):
+        self.client.force_login(self.staff)
+        response = self.get(HTTP_X_PROFILE='1')
+        self.sampler_class.return_value.start.assert_called_once_with()
+        self.assertEqual(self.folded_files(), [response['X-Profile-Id']])
+        with open(os.path.join(self.output_dir, response['X-Profile-Id'])) as fh:
+            self.assertEqual(fh.read(), 'view (views.py:1) 3\n')
+
+    @override_settings(REQUEST_PROFILER_SAMPLE_RATE=3)
+    def test_sample_rate_profiles_every_nth_request_per_route(self):
+        for _ in range(2):
+            self.get()
+        self.sampler_class.assert_not_called()
+        response = self.get()
+        self.assertEqual(self.sampler_class.call_count, 1)
+        # Sampled, but the caller is not staff: no id is handed out.
+        self.assertNotIn('X-Profile-Id', response)
+        self.assertEqual(len(self.folded_files()), 1)
+
+    @override_settings(REQUEST_PROFILER_MAX_FILES=2)
+    def test_prunes_all_but_the_newest_files(self):
+        old = time.time() - 3600
+        for i in range(3):
+            path = os.path.join(self.output_dir, f'old-{i}.folded')
+            open(path, 'w').close()
+            os.utime(path, (old + i, old + i))
+        open(os.path.join(self.output_dir, 'notes.txt'), 'w').close()
+        self.client.force_login(self.staff)
+        response = self.get(HTTP_X_PROFILE='1')
+        self.assertEqual(self.folded_files(), sorted(['old-2.folded', response['X-Profile-Id']]))
+        self.assertTrue(os.path.exists(os.path.join(self.output_dir, 'notes.txt')))
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class CachedAuthenticationTests(TestCase):
+
+    def setUp(self):
+        # Ids are reused between tests, so users cached by an earlier test
+        # would otherwise be served under the same id and generation.
+        cache.clear()
+        _local_users.clear()
+        self.user = User.objects.create_user(username='guest', password='testpass123')
+        self.token = Token.objects.create(user=self.user)
+
+    def authenticate(self):
+        request = Request(RequestFactory().get('/', HTTP_AUTHORIZATION=f'Token {self.token.key}'))
+        return CachedTokenAuthentication().authenticate(request)
+
+    def test_warm_token_authentication_makes_no_queries(self):
+        self.authenticate()
+        with self.assertNumQueries(0):
+            user, _ = self.authenticate()
+        self.assertEqual(user, self.user)
+
+    def test_deleted_token_is_rejected(self):
+        self.authenticate()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.token.delete()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
+
+    def test_deactivated_user_is_rejected(self):
+        self.authenticate()
+        self.user.is_active = False
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
+
+    def test_bulk_deactivation_is_seen_despite_stale_local_entry(self):
+        # The local LRU still holds the active user, as it would in any
+        # process other than the one that handled the change.
+        self.authenticate()
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        invalidate_users(self.user.pk)
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
+
+    def test_password_change_reaches_session_backend(self):
+        backend = CachedModelBackend()
+        old_hash = backend.get_user(str(self.user.pk)).get_session_auth_hash()
+        self.user.set_password('newpass456')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save()
+        user = backend.get_user(str(self.user.pk))
+        self.assertNotEqual(user.get_session_auth_hash(), old_hash)
+        self.assertTrue(user.check_password('newpass456'))
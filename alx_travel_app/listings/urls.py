@@ -13,9 +13,11 @@ router.register(r'bookings', views.BookingViewSet, basename='booking')
 app_name = 'listings'
 
 urlpatterns = [
+    # Custom endpoints (ahead of the router so the .ics URLs are not
+    # mistaken for format suffixes)
+    path('listings/calendar.ics', views.bulk_calendar, name='bulk-calendar'),
+    path('listings/<int:pk>/calendar.ics', views.listing_calendar, name='listing-calendar'),
+
     # API Root
     path('', include(router.urls)),
-
-    # Custom endpoints
-    # path('custom-endpoint/', views.custom_view, name='custom-endpoint'),
 ]
\ No newline at end of file
@@ -1,16 +1,29 @@
 from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from django.conf import settings
 from django.db.models import Q, Avg
+from django.urls import reverse
+from django.http import Http404, HttpResponse, HttpResponseBadRequest
+from django.views.decorators.http import condition, require_GET
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import filters
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
-from .models import Category, Listing, ListingImage, Review, Booking
+from .models import Category, HostFeedSecret, Listing, ListingImage, Review, Booking
+from .calendars import (
+    check_feed_token, feed_token, get_listing_calendar, get_bulk_calendar,
+    host_feed_secret, rotate_feed_secrets
+)
+from .recommendations import similar_listing_ids
+from .reviews import get_review_summary
 from .serializers import (
     CategorySerializer, ListingSerializer, ListingListSerializer,
-    ListingImageSerializer, ReviewSerializer, BookingSerializer
+    ListingImageSerializer, ReviewSerializer, BookingSerializer,
+    BookingHistorySerializer, ListingReviewSerializer
 )
+from .archive import booking_history
+from .availability import find_windows
 
 
 class CategoryViewSet(viewsets.ModelViewSet):
@@ -78,17 +91,68 @@ class ListingViewSet(viewsets.ModelViewSet):
 
         return queryset
 
+    REVIEW_ORDERINGS = {
+        'recent': ['-created_at', '-id'],
+        'oldest': ['created_at', 'id'],
+        'highest': ['-rating', '-created_at', '-id'],
+        'lowest': ['rating', '-created_at', '-id'],
+    }
+
     @swagger_auto_schema(
-        operation_description="Get reviews for a specific listing",
-        responses={200: ReviewSerializer(many=True)}
+        operation_description="Get a page of reviews for a specific listing, with a rating summary",
+        manual_parameters=[
+            openapi.Parameter('sort', openapi.IN_QUERY, description="recent (default), oldest, highest or lowest",
+                              type=openapi.TYPE_STRING),
+        ],
+        responses={200: openapi.Response('Page of reviews with a rating summary', openapi.Schema(
+            type=openapi.TYPE_OBJECT,
+            properties={
+                'summary': openapi.Schema(type=openapi.TYPE_OBJECT, properties={
+                    'average': openapi.Schema(type=openapi.TYPE_NUMBER, x_nullable=True),
+                    'count': openapi.Schema(type=openapi.TYPE_INTEGER),
+                    'distribution': openapi.Schema(
+                        type=openapi.TYPE_OBJECT,
+                        description="Number of reviews per rating, keyed '1' to '5'",
+                        additional_properties=openapi.Schema(type=openapi.TYPE_INTEGER),
+                    ),
+                }),
+                'count': openapi.Schema(type=openapi.TYPE_INTEGER),
+                'next': openapi.Schema(type=openapi.TYPE_STRING, format=openapi.FORMAT_URI, x_nullable=True),
+                'previous': openapi.Schema(type=openapi.TYPE_STRING, format=openapi.FORMAT_URI, x_nullable=True),
+                'results': openapi.Schema(type=openapi.TYPE_ARRAY, items=openapi.Schema(
+                    type=openapi.TYPE_OBJECT,
+                    properties={
+                        'id': openapi.Schema(type=openapi.TYPE_INTEGER),
+                        'reviewer': openapi.Schema(type=openapi.TYPE_OBJECT, properties={
+                            'id': openapi.Schema(type=openapi.TYPE_INTEGER),
+                            'username': openapi.Schema(type=openapi.TYPE_STRING),
+                        }),
+                        'rating': openapi.Schema(type=openapi.TYPE_INTEGER),
+                        'comment': openapi.Schema(type=openapi.TYPE_STRING),
+                        'created_at': openapi.Schema(type=openapi.TYPE_STRING, format=openapi.FORMAT_DATETIME),
+                    },
+                )),
+            },
+        ))}
     )
     @action(detail=True, methods=['get'])
     def reviews(self, request, pk=None):
-        """Get all reviews for a specific listing."""
+        """Get a page of active reviews for a specific listing."""
         listing = self.get_object()
-        reviews = Review.objects.filter(listing=listing, is_active=True)
-        serializer = ReviewSerializer(reviews, many=True, context={'request': request})
-        return Response(serializer.data)
+        ordering = self.REVIEW_ORDERINGS.get(request.query_params.get('sort', 'recent'))
+        if ordering is None:
+            return Response(
+                {'error': f"sort must be one of: {', '.join(self.REVIEW_ORDERINGS)}."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        reviews = Review.objects.filter(listing=listing, is_active=True) \
+            .select_related('reviewer').order_by(*ordering)
+        page = self.paginate_queryset(reviews)
+        serializer = ListingReviewSerializer(page, many=True, context={'request': request})
+        response = self.get_paginated_response(serializer.data)
+        response.data = {'summary': get_review_summary(listing.id), **response.data}
+        return response
 
     @swagger_auto_schema(
         operation_description="Add a review to a specific listing",
@@ -119,6 +183,180 @@ class ListingViewSet(viewsets.ModelViewSet):
 
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    @swagger_auto_schema(
+        operation_description="Get the listings most similar to a specific listing",
+        manual_parameters=[
+            openapi.Parameter('k', openapi.IN_QUERY,
+                              description=f"Number of listings to return (1-{settings.SIMILAR_LISTINGS_NEIGHBOURS})",
+                              type=openapi.TYPE_INTEGER),
+        ],
+        responses={200: ListingListSerializer(many=True)}
+    )
+    @action(detail=True, methods=['get'])
+    def similar(self, request, pk=None):
+        """Get similar listings from the precomputed recommendation index."""
+        listing = self.get_object()
+        try:
+            k = int(request.query_params.get('k', 10))
+        except ValueError:
+            k = 0
+        if k < 1:
+            return Response(
+                {'error': 'k must be a positive integer.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        # The index stores SIMILAR_LISTINGS_NEIGHBOURS neighbours per listing.
+        k = min(k, settings.SIMILAR_LISTINGS_NEIGHBOURS)
+
+        ids = similar_listing_ids(listing.id, k=k)
+        listings = Listing.objects.in_bulk(ids)
+        similar = [listings[i] for i in ids if i in listings and listings[i].is_active]
+        serializer = ListingListSerializer(similar, many=True, context={'request': request})
+        return Response(serializer.data)
+
+    MAX_FLEXIBLE_CANDIDATES = 500
+
+    def _flexible_params(self, request):
+        """Parse and bound nights / within_days / limit for the flexible search actions."""
+        try:
+            nights = int(request.query_params.get('nights', 1))
+            within_days = int(request.query_params.get('within_days', 30))
+            limit = int(request.query_params.get('limit', 10))
+        except ValueError:
+            return None
+        if not (1 <= nights <= 30 and nights <= within_days <= 365 and 1 <= limit <= 50):
+            return None
+        return nights, within_days, limit
+
+    @swagger_auto_schema(
+        operation_description="Find free N-night stays at a listing, cheapest and earliest first",
+        manual_parameters=[
+            openapi.Parameter('nights', openapi.IN_QUERY, description="Length of stay (1-30)",
+                              type=openapi.TYPE_INTEGER),
+            openapi.Parameter('within_days', openapi.IN_QUERY, description="Search horizon in days (up to 365)",
+                              type=openapi.TYPE_INTEGER),
+            openapi.Parameter('limit', openapi.IN_QUERY, description="Maximum windows to return (up to 50)",
+                              type=openapi.TYPE_INTEGER),
+        ],
+        responses={200: openapi.Response('Free windows', openapi.Schema(type=openapi.TYPE_OBJECT))}
+    )
+    @action(detail=True, methods=['get'])
+    def flexible(self, request, pk=None):
+        """Find free stays of a given length within a horizon for one listing."""
+        listing = self.get_object()
+        params = self._flexible_params(request)
+        if params is None:
+            return Response(
+                {'error': 'nights must be 1-30, within_days between nights and 365, limit 1-50.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        nights, within_days, limit = params
+
+        windows = find_windows([listing], nights, within_days, limit=limit)[listing.id] \
+            if listing.is_available else []
+        return Response({
+            'listing_id': listing.id,
+            'nights': nights,
+            'within_days': within_days,
+            'windows': windows,
+        })
+
+    @swagger_auto_schema(
+        operation_description=(
+            "Find free N-night stays across listing search results. The 500 "
+            "filtered listings with the lowest nightly price are ranked by "
+            "cheapest, then earliest, free window before paginating; listings "
+            "with no free window are left out."
+        ),
+        manual_parameters=[
+            openapi.Parameter('nights', openapi.IN_QUERY, description="Length of stay (1-30)",
+                              type=openapi.TYPE_INTEGER),
+            openapi.Parameter('within_days', openapi.IN_QUERY, description="Search horizon in days (up to 365)",
+                              type=openapi.TYPE_INTEGER),
+            openapi.Parameter('limit', openapi.IN_QUERY, description="Maximum windows per listing (up to 50)",
+                              type=openapi.TYPE_INTEGER),
+        ],
+        responses={200: openapi.Response('Free windows per listing', openapi.Schema(type=openapi.TYPE_OBJECT))}
+    )
+    @action(detail=False, methods=['get'], url_path='flexible')
+    def flexible_search(self, request):
+        """
+        Find free stays across listing search results (the usual list filters
+        apply). The MAX_FLEXIBLE_CANDIDATES filtered listings with the lowest
+        nightly price (then id) are ranked by their cheapest, then earliest,
+        free window and then paginated, so ordering and count are consistent
+        across pages; listings with no free window are left out.
+        """
+        params = self._flexible_params(request)
+        if params is None:
+            return Response(
+                {'error': 'nights must be 1-30, within_days between nights and 365, limit 1-50.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        nights, within_days, limit = params
+
+        # A deterministic, price-ordered cut: the cheapest nightly prices are
+        # the likeliest to hold the cheapest windows, and a stable order keeps
+        # the candidate set the same from one page request to the next.
+        candidates = list(
+            self.filter_queryset(self.get_queryset())
+            .order_by('price_per_night', 'id')[:self.MAX_FLEXIBLE_CANDIDATES]
+        )
+        windows = find_windows(candidates, nights, within_days, limit=limit)
+        matches = sorted(
+            (listing for listing in candidates if windows.get(listing.id)),
+            key=lambda listing: (windows[listing.id][0]['total_price'], windows[listing.id][0]['check_in'])
+        )
+
+        page = self.paginate_queryset(matches)
+        listings = ListingListSerializer(page, many=True, context={'request': request}).data
+        results = [
+            {'listing': data, 'windows': windows[listing.id]}
+            for listing, data in zip(page, listings)
+        ]
+        return self.get_paginated_response(results)
+
+    @swagger_auto_schema(
+        method='get',
+        operation_description="Get the secret iCal feed URLs for a listing and for all of the host's listings",
+        responses={200: openapi.Response('Feed URLs', openapi.Schema(type=openapi.TYPE_OBJECT))}
+    )
+    @swagger_auto_schema(
+        method='post',
+        operation_description=(
+            "Regenerate the listing's and the host's feed secrets, revoking the old "
+            "feed URLs, and return the new ones"
+        ),
+        request_body=openapi.Schema(type=openapi.TYPE_OBJECT),
+        responses={200: openapi.Response('New feed URLs', openapi.Schema(type=openapi.TYPE_OBJECT))}
+    )
+    @action(detail=True, methods=['get', 'post'], permission_classes=[permissions.IsAuthenticated])
+    def calendar_feed(self, request, pk=None):
+        """
+        Return the tokenised calendar feed URLs, regenerating them on POST;
+        only the listing's host may see or rotate them.
+        """
+        listing = self.get_object()
+        if listing.host_id != request.user.id:
+            return Response(
+                {'error': 'Only the host can view calendar feed URLs.'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        if request.method == 'POST':
+            rotate_feed_secrets(listing)
+        host_secret = HostFeedSecret.objects.get_or_create(host_id=listing.host_id)[0].secret
+
+        listing_url = reverse('listings:listing-calendar', args=[listing.id])
+        host_url = reverse('listings:bulk-calendar')
+        return Response({
+            'listing_feed': request.build_absolute_uri(
+                f"{listing_url}?token={feed_token('listing', listing.id, listing.calendar_secret)}"
+            ),
+            'host_feed': request.build_absolute_uri(
+                f"{host_url}?host={listing.host_id}&token={feed_token('host', listing.host_id, host_secret)}"
+            ),
+        })
+
     @swagger_auto_schema(
         operation_description="Check availability for specific dates",
         manual_parameters=[
@@ -217,6 +455,18 @@ class BookingViewSet(viewsets.ModelViewSet):
         """Set the guest to the current user."""
         serializer.save(guest=self.request.user)
 
+    @swagger_auto_schema(
+        operation_description="Get the current user's booking history, including archived bookings",
+        responses={200: BookingHistorySerializer(many=True)}
+    )
+    @action(detail=False, methods=['get'])
+    def history(self, request):
+        """List live and archived bookings for the current user."""
+        history = booking_history(guest=request.user).order_by('-check_in_date', '-id')
+        page = self.paginate_queryset(history)
+        serializer = BookingHistorySerializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
     @swagger_auto_schema(
         operation_description="Cancel a booking",
         responses={200: openapi.Response('Booking cancelled')}
@@ -236,4 +486,90 @@ class BookingViewSet(viewsets.ModelViewSet):
         booking.save()
 
         serializer = self.get_serializer(booking)
-        return Response(serializer.data)
\ No newline at end of file
+        return Response(serializer.data)
+
+
+# iCal availability feeds
+#
+# Plain Django views rather than viewset actions: channel managers expect a
+# text/calendar body at a stable ".ics" URL, and the condition() decorator
+# gives us ETag / If-Modified-Since handling with a 304 before any rendering.
+# Channel managers cannot send API credentials, so access is by the secret
+# ?token= in the feed URL (see ListingViewSet.calendar_feed); a missing,
+# wrong or rotated token is a 404.
+
+MAX_BULK_CALENDAR_LISTINGS = 200
+
+
+def _listing_calendar_entry(request, pk):
+    if not hasattr(request, '_calendar_entry'):
+        request._calendar_entry = None
+        token = request.GET.get('token')
+        entry = get_listing_calendar(pk) if token else None
+        if entry is not None and check_feed_token('listing', pk, entry['secret'], token):
+            request._calendar_entry = entry
+    return request._calendar_entry
+
+
+def _bulk_calendar_listing_ids(request):
+    host = int(request.GET['host'])
+    token = request.GET.get('token')
+    if not token or not check_feed_token('host', host, host_feed_secret(host), token):
+        return []
+    listing_ids = Listing.objects.filter(host_id=host, is_active=True).order_by('id')
+    subset = [i for i in request.GET.get('listings', '').split(',') if i]
+    if subset:
+        listing_ids = listing_ids.filter(id__in=[int(i) for i in subset])
+    return list(listing_ids.values_list('id', flat=True)[:MAX_BULK_CALENDAR_LISTINGS])
+
+
+def _bulk_calendar_entry(request):
+    if not hasattr(request, '_calendar_entry'):
+        try:
+            listing_ids = _bulk_calendar_listing_ids(request)
+        except (KeyError, ValueError):
+            listing_ids = []
+        request._calendar_entry = get_bulk_calendar(listing_ids) if listing_ids else None
+    return request._calendar_entry
+
+
+def _entry_etag(entry):
+    return entry['etag'] if entry else None
+
+
+def _entry_last_modified(entry):
+    return entry['last_modified'] if entry else None
+
+
+def _calendar_response(entry):
+    if entry is None:
+        raise Http404('No calendar found.')
+    response = HttpResponse(entry['body'], content_type='text/calendar; charset=utf-8')
+    response['Cache-Control'] = 'private, max-age=60'
+    return response
+
+
+@require_GET
+@condition(
+    etag_func=lambda request, pk: _entry_etag(_listing_calendar_entry(request, pk)),
+    last_modified_func=lambda request, pk: _entry_last_modified(_listing_calendar_entry(request, pk)),
+)
+def listing_calendar(request, pk):
+    """iCal feed of a listing's confirmed and pending bookings (?token= required)."""
+    return _calendar_response(_listing_calendar_entry(request, pk))
+
+
+@require_GET
+@condition(
+    etag_func=lambda request: _entry_etag(_bulk_calendar_entry(request)),
+    last_modified_func=lambda request: _entry_last_modified(_bulk_calendar_entry(request)),
+)
+def bulk_calendar(request):
+    """
+    Combined iCal feed for a host's listings, selected with
+    ?host=<user id>&token=<host feed token>, optionally narrowed with
+    &listings=1,2,3.
+    """
+    if not request.GET.get('host'):
+        return HttpResponseBadRequest('host is required.')
+    return _calendar_response(_bulk_calendar_entry(request))
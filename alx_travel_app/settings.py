@@ -32,8 +32,10 @@ INSTALLED_APPS = [
 
     # Third-party apps
     'rest_framework',
+    'rest_framework.authtoken',
     'corsheaders',
     'drf_yasg',
+    'django_filters',
 
     # Local apps
     'listings',
@@ -46,11 +48,12 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'listings.profiling.RequestProfilerMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
-ROOT_URLCONF = 'alx_travel_ap.urls'
+ROOT_URLCONF = 'alx_travel_app.urls'
 
 TEMPLATES = [
     {
@@ -68,7 +71,7 @@ TEMPLATES = [
     },
 ]
 
-WSGI_APPLICATION = 'alx_travel_ap.wsgi.application'
+WSGI_APPLICATION = 'alx_travel_app.wsgi.application'
 
 # Database Configuration
 DATABASES = {
@@ -85,6 +88,18 @@ DATABASES = {
     }
 }
 
+# Authentication: users and tokens are served from the shared cache with an
+# in-process LRU in front (see listings/authentication.py); sessions read from
+# the cache and write through to the database. ModelBackend stays listed so
+# sessions created before CachedModelBackend was added remain valid.
+AUTHENTICATION_BACKENDS = [
+    'listings.authentication.CachedModelBackend',
+    'django.contrib.auth.backends.ModelBackend',
+]
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+AUTH_CACHE_LOCAL_SIZE = 10000
+AUTH_CACHE_SHARED_TTL = 60
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -115,6 +130,23 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Cache (shared by all web and Celery workers)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': env('REDIS_CACHE_URL', default='redis://localhost:6379/1'),
+    }
+}
+
+# Request profiler: staff can profile one request with the "X-Profile: 1"
+# header or ?_profile=1; a sample rate of N > 0 also profiles 1 in N requests
+# per route. Collapsed stacks are written to REQUEST_PROFILER_DIR, keeping the
+# newest REQUEST_PROFILER_MAX_FILES.
+REQUEST_PROFILER_DIR = env('REQUEST_PROFILER_DIR', default=os.path.join(BASE_DIR, 'var', 'profiles'))
+REQUEST_PROFILER_SAMPLE_RATE = env.int('REQUEST_PROFILER_SAMPLE_RATE', default=0)
+REQUEST_PROFILER_INTERVAL = 0.005
+REQUEST_PROFILER_MAX_FILES = 500
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
@@ -122,7 +154,7 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework.authentication.SessionAuthentication',
-        'rest_framework.authentication.TokenAuthentication',
+        'listings.authentication.CachedTokenAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
@@ -183,4 +215,34 @@ CELERY_RESULT_BACKEND = env('REDIS_URL', default='redis://localhost:6379/0')
 CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
-CELERY_TIMEZONE = TIME_ZONE
\ No newline at end of file
+CELERY_TIMEZONE = TIME_ZONE
+
+CELERY_BEAT_SCHEDULE = {
+    'rebuild-similar-listings-index': {
+        'task': 'listings.tasks.rebuild_similar_listings_index',
+        'schedule': 60 * 60,
+    },
+    'expire-pending-bookings': {
+        'task': 'listings.tasks.expire_pending_bookings',
+        'schedule': 5 * 60,
+    },
+    'archive-old-bookings': {
+        'task': 'listings.tasks.archive_old_bookings',
+        'schedule': 24 * 60 * 60,
+    },
+}
+
+# Pending bookings older than this are cancelled by expire_pending_bookings
+PENDING_BOOKING_TTL_MINUTES = env.int('PENDING_BOOKING_TTL_MINUTES', default=30)
+PENDING_BOOKING_EXPIRY_CHUNK_SIZE = 1000
+
+# Completed/cancelled bookings that checked out this long ago move to ArchivedBooking
+BOOKING_ARCHIVE_AFTER_DAYS = env.int('BOOKING_ARCHIVE_AFTER_DAYS', default=180)
+BOOKING_ARCHIVE_CHUNK_SIZE = 1000
+
+# Similar listings recommendation index (memory-mapped, shared by all workers)
+SIMILAR_LISTINGS_INDEX_DIR = env(
+    'SIMILAR_LISTINGS_INDEX_DIR',
+    default=os.path.join(BASE_DIR, 'var', 'similar_listings')
+)
+SIMILAR_LISTINGS_NEIGHBOURS = 20
\ No newline at end of file